@@ -3,29 +3,93 @@
 import os
 import re
 import json
-from dotenv import load_dotenv
+import asyncio
+import time
+import openai
 from openai import AsyncOpenAI
-from agents import Agent, OpenAIChatCompletionsModel, Runner
-from tools.book_info_tool import get_book_info_raw # Import the raw function
+from agents import Agent, Model, ModelProvider, OpenAIChatCompletionsModel, RunConfig, Runner
+from openai.types.responses import ResponseTextDeltaEvent
+from tools.book_info_tool import BOOK_CACHE_TTL, book_cache_key, get_book_info_async
+from utils import normalize
+from books import BookRecord
+from render import render_json, render_markdown, render_plain
+from singleflight import SingleFlight
+from cache import LRUCache, TieredCache
+from demand import DEMAND
+from intent_router import ROUTER_STATS, fast_route
+from sessions import create_session_store
+from metrics import record_error, record_tokens, record_upstream, set_intent, stage
+from resilience import Upstream, UpstreamUnavailable
+from scheduler import PriorityScheduler, UpstreamOverloaded
 from fastapi import Request
 
 # --- Basic Setup ---
-load_dotenv()
-gemini_api_key = os.getenv("GEMINI_API_KEY")
+# The client is created on the first LLM call (see GeminiModelProvider), so importing this
+# module is cheap and doesn't need GEMINI_API_KEY; main.py loads .env before importing it.
+_client = None
+
+def get_llm_client() -> AsyncOpenAI:
+    global _client
+    if _client is None:
+        gemini_api_key = os.getenv("GEMINI_API_KEY")
+        # It's good practice to handle the case where the key is missing
+        if not gemini_api_key:
+            raise ValueError("GEMINI_API_KEY not found in environment variables.")
+        _client = AsyncOpenAI(
+            api_key=gemini_api_key,
+            base_url=os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta/openai/"),
+            max_retries=0,  # retries are owned by the GEMINI upstream below, under the shared retry budget
+        )
+    return _client
+
+# --- Upstream Resilience ---
+GEMINI = Upstream(
+    "gemini",
+    timeout=float(os.getenv("LLM_TIMEOUT", "30")),
+    retry_on=(openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError),
+    max_attempts=int(os.getenv("LLM_ATTEMPTS", "2")),
+    # One slot per Runner.run / streamed run; LLM_RATE_LIMIT is in runs per second, 0 = unlimited.
+    scheduler=PriorityScheduler(
+        "gemini",
+        rate=float(os.getenv("LLM_RATE_LIMIT", "10")),
+        burst=float(os.getenv("LLM_BURST", "20")),
+    ),
+)
+UPSTREAM_DOWN = "I'm having trouble reaching my book knowledge right now. Please try again in a moment."
+OVERLOADED = "I'm getting more requests than I can handle right now. Please try again in a few seconds."
 
-# It's good practice to handle the case where the key is missing
-if not gemini_api_key:
-    raise ValueError("GEMINI_API_KEY not found in environment variables.")
+# --- Enrichment Settings ---
+ENRICH_CONCURRENCY = int(os.getenv("ENRICH_CONCURRENCY", "5"))  # parallel metadata lookups per reply
+ENRICH_TIMEOUT = float(os.getenv("ENRICH_TIMEOUT", "4.0"))      # per-book deadline, in seconds
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))    # parallel items per /books/batch call
 
-client = AsyncOpenAI(
-    api_key=gemini_api_key,
-    base_url="https://generativelanguage.googleapis.com/v1beta/openai/"
-)
+# --- Response Cache Settings ---
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", str(24 * 3600)))
+RESPONSE_CACHE_DB = os.getenv("RESPONSE_CACHE_DB")  # optional SQLite file for a restart-proof tier
+
+# --- Rendered Block Cache ---
+BLOCK_CACHE_SIZE = int(os.getenv("BLOCK_CACHE_SIZE", "2048"))
+BLOCK_CACHE_TTL = float(os.getenv("BLOCK_CACHE_TTL", "3600"))  # kept shorter than the metadata it renders
 
 # --- Agent Models ---
 # Use a single fast model for both routing and generation
-router_model = OpenAIChatCompletionsModel(model="gemini-2.0-flash", openai_client=client)
-worker_model = OpenAIChatCompletionsModel(model="gemini-2.0-flash", openai_client=client)
+GEMINI_MODEL = "gemini-2.0-flash"
+
+class GeminiModelProvider(ModelProvider):
+    """Resolves the agents' model names to chat-completions models on the shared, lazily created client."""
+
+    def __init__(self):
+        self._models = {}
+
+    def get_model(self, model_name: str | None) -> Model:
+        model_name = model_name or GEMINI_MODEL
+        model = self._models.get(model_name)
+        if model is None:
+            model = self._models[model_name] = OpenAIChatCompletionsModel(model=model_name, openai_client=get_llm_client())
+        return model
+
+RUN_CONFIG = RunConfig(model_provider=GeminiModelProvider())
 
 # --------------------------------------------------------------------------
 # AGENT DEFINITIONS - THE CORE OF THE INTELLIGENCE
@@ -92,7 +156,7 @@ You must extract the relevant information for each intent into a JSON object.
 - User: "adventurous" (in response to a question) -> {"intent": "clarification_response", "mood": "adventurous", "confidence_score": 0.8}
 - User: "fantasy" (in response to a question) -> {"intent": "clarification_response", "genre": "fantasy", "confidence_score": 0.8}
 """,
-    model=router_model
+    model=GEMINI_MODEL
 )
 
 # ✅ 2. Book Recommendation Agent — The Creative Matchmaker
@@ -126,7 +190,7 @@ Divergent :: Set in a dystopian society where young people must make life-alteri
 Legend by Marie Lu :: Follows two teens from different backgrounds in a militarized, oppressive society, both fighting for justice and survival, similar to the dual perspectives and high-stakes world of The Hunger Games.
 Red Queen by Victoria Aveyard :: Features a divided society, a young heroine with hidden powers, and a fight against tyranny, closely matching the social structure and resistance themes of The Hunger Games.
 """,
-    model=worker_model
+    model=GEMINI_MODEL
 )
 
 # ✅ 3. Book Summary Agent — The Master Storyteller
@@ -151,11 +215,33 @@ TITLE:: To Kill a Mockingbird
 SUMMARY:: Set in the racially charged town of Maycomb, Alabama, during the Great Depression, the story is told through the eyes of a young girl named Scout Finch...[full summary]
 MORAL:: True courage is not the absence of fear, but standing up for what is right even when you know you are likely to lose.
 """,
-    model=worker_model
+    model=GEMINI_MODEL
 )
 
 # --- Session & Orchestration Logic ---
-SESSION_STATE = {}
+AGENT_FLIGHTS = SingleFlight("agent_runs")
+
+def _total_tokens(result) -> int:
+    usage = getattr(getattr(result, "context_wrapper", None), "usage", None)
+    return getattr(usage, "total_tokens", 0) or 0
+
+async def _run_agent(agent: Agent, prompt: str):
+    """Runner.run with the LLM call timed and counted for the current request."""
+    async def attempt():
+        record_upstream("gemini")
+        return await Runner.run(agent, prompt, run_config=RUN_CONFIG)
+
+    with stage("router_llm" if agent is book_master_agent else "worker_llm"):
+        result = await GEMINI.call(attempt)
+    record_tokens(_total_tokens(result))
+    return result
+
+async def _run_worker(agent: Agent, prompt: str):
+    """Runs a worker agent, sharing one LLM call between identical concurrent prompts."""
+    key = f"{agent.name}:{normalize(prompt)}"
+    return await AGENT_FLIGHTS.do(key, lambda: _run_agent(agent, prompt))
+
+SESSION_STORE = create_session_store()
 
 def get_session_id(req: Request, user_id: str = None):
     if user_id: return user_id
@@ -165,132 +251,461 @@ def get_session_id(req: Request, user_id: str = None):
 
 async def run_book_agent_orchestrator(message: str, request: Request, user_id: str = None):
     """The main orchestrator that routes user requests to the correct agent or function."""
-    session_id = get_session_id(request, user_id)
-    session_data = SESSION_STATE.get(session_id, {"genre": None, "mood": None})
+    try:
+        kind, payload = await _plan_reply(message, get_session_id(request, user_id))
+        if kind == "reply":
+            return {"final_output": payload}
+        elif kind == "recommend":
+            return await _handle_recommendations(*payload)
+        elif kind == "summary":
+            return await _handle_summary(payload)
+        elif kind == "details":
+            return await _handle_details(payload)
+        else:  # chit_chat
+            generic_response = await _run_agent(book_recommendation_agent, payload)
+            return {"final_output": generic_response.final_output}
+    except UpstreamOverloaded:
+        return {"final_output": OVERLOADED, "overloaded": True}
+    except UpstreamUnavailable:
+        return {"final_output": UPSTREAM_DOWN}
+
+async def stream_book_agent_orchestrator(message: str, request: Request, user_id: str = None):
+    """
+    Streaming variant of `run_book_agent_orchestrator`. Yields events as dicts:
+    `token` (worker LLM text delta), `block` (an enriched book block, sent as soon as it is
+    ready; `index` is its position in the LLM's list) and a final `done` with the full reply.
+    """
+    try:
+        kind, payload = await _plan_reply(message, get_session_id(request, user_id))
+    except UpstreamUnavailable as exc:
+        yield {"event": "done", "data": OVERLOADED if isinstance(exc, UpstreamOverloaded) else UPSTREAM_DOWN}
+        return
 
-    router_prompt = f'User Message: "{message}"\nCurrent Session State: {json.dumps(session_data)}'
-    router_result = await Runner.run(book_master_agent, router_prompt)
-    
     try:
-        cleaned_output = re.sub(r'```json\s*|\s*```', '', router_result.final_output, flags=re.DOTALL).strip()
-        intent_data = json.loads(cleaned_output)
-        intent = intent_data.get("intent")
-    except (json.JSONDecodeError, AttributeError, TypeError):
+        if kind == "reply":
+            yield {"event": "done", "data": payload}
+        elif kind == "recommend":
+            async for event in _stream_recommendations(*payload):
+                yield event
+        elif kind == "summary":
+            async for event in _stream_summary(payload):
+                yield event
+        elif kind == "details":
+            block = await _format_book_block(payload)
+            if block:
+                yield {"event": "block", "index": 0, "data": block}
+            yield {"event": "done", "data": block or NO_DETAILS.format(query=payload)}
+        else:  # chit_chat
+            text = ""
+            async for delta in _stream_worker(book_recommendation_agent, payload):
+                text += delta
+                yield {"event": "token", "data": delta}
+            yield {"event": "done", "data": text}
+    except UpstreamUnavailable as exc:
+        yield {"event": "done", "data": await _fallback_reply(kind, payload, isinstance(exc, UpstreamOverloaded))}
+
+async def _fallback_reply(kind: str, payload, overloaded: bool = False) -> str:
+    """Answer from expired cache entries when the LLM is unavailable or shedding load."""
+    unavailable = OVERLOADED if overloaded else UPSTREAM_DOWN
+    if kind == "recommend":
+        stale = await RESPONSE_CACHE.get_stale_async(_recommendation_key(payload[0]))
+        if stale:
+            return "\n".join(await _enrich_recommendations(stale, payload[1])) or unavailable
+    elif kind == "summary":
+        stale = await RESPONSE_CACHE.get_stale_async(_summary_key(payload))
+        if stale:
+            title, summary, moral = stale
+            return await _format_book_block(title, summary=summary, moral=moral) or summary
+    return unavailable
+
+async def _plan_reply(message: str, session_id: str) -> tuple:
+    """
+    Routes the message and updates the genre/mood session. Returns `(kind, payload)`:
+    ("reply", text) for answers that need no worker, ("recommend", (prompt, is_similar)),
+    ("summary", query), ("details", query) or ("chit_chat", prompt).
+    """
+    session = await asyncio.to_thread(SESSION_STORE.get, session_id)
+
+    with stage("route"):
+        intent_data = fast_route(message)
+        if intent_data is not None:
+            ROUTER_STATS.record_fast()
+        else:
+            intent_data = await _llm_route(message, session.as_dict())
+    if intent_data is None:
         # Fallback if the router fails catastrophically
-        return {"final_output": "I'm sorry, I had a little trouble understanding that. Could you please rephrase?"}
+        record_error("route")
+        return "reply", "I'm sorry, I had a little trouble understanding that. Could you please rephrase?"
+    intent = intent_data.get("intent")
+    set_intent(intent)
 
     # Handle multi-turn conversation for genre/mood
     if intent == "recommend_genre_mood" or intent == "clarification_response":
-        session_data["genre"] = intent_data.get("genre") or session_data.get("genre")
-        session_data["mood"] = intent_data.get("mood") or session_data.get("mood")
+        session.genre = intent_data.get("genre") or session.genre
+        session.mood = intent_data.get("mood") or session.mood
         
-        if session_data["genre"] and not session_data["mood"]:
-            SESSION_STATE[session_id] = session_data
-            return {"final_output": f"Sounds good, you're looking for a **{session_data['genre']}** book. What kind of mood are you in? (e.g., adventurous, thoughtful, relaxing)"}
+        if session.genre and not session.mood:
+            await asyncio.to_thread(SESSION_STORE.save, session_id, session)
+            return "reply", f"Sounds good, you're looking for a **{session.genre}** book. What kind of mood are you in? (e.g., adventurous, thoughtful, relaxing)"
         
-        if not session_data["genre"] and session_data["mood"]:
-            SESSION_STATE[session_id] = session_data
-            return {"final_output": f"Got it, you want something **{session_data['mood']}**. What genre? (e.g., Sci-Fi, Fantasy, Mystery)"}
+        if not session.genre and session.mood:
+            await asyncio.to_thread(SESSION_STORE.save, session_id, session)
+            return "reply", f"Got it, you want something **{session.mood}**. What genre? (e.g., Sci-Fi, Fantasy, Mystery)"
         
-        if session_data["genre"] and session_data["mood"]:
-            query = f"A {session_data['mood']} {session_data['genre']} book"
-            SESSION_STATE[session_id] = {"genre": None, "mood": None}  # Clear state after use
-            return await _handle_recommendations(query, is_similar=False)
+        if session.genre and session.mood:
+            query = _genre_mood_query(session.genre, session.mood)
+            await asyncio.to_thread(SESSION_STORE.clear, session_id)  # Clear state after use
+            await asyncio.to_thread(DEMAND.record, "genre_mood", f"{session.genre}|{session.mood}".lower())
+            return "recommend", (query, False)
         else:
-             SESSION_STATE[session_id] = session_data
-             return {"final_output": "To give you the best recommendations, I need a genre (like Sci-Fi) and a mood (like Adventurous). What are you looking for?"}
+             await asyncio.to_thread(SESSION_STORE.save, session_id, session)
+             return "reply", "To give you the best recommendations, I need a genre (like Sci-Fi) and a mood (like Adventurous). What are you looking for?"
 
     # Route to the correct worker based on intent
     if intent == "greeting":
-        return {"final_output": "Yes, I'm fine. How can I help you?"}
+        return "reply", "Yes, I'm fine. How can I help you?"
     elif intent == "recommend_similar":
         query = intent_data.get("query", message)
-        return await _handle_recommendations(f"Books similar to {query}", is_similar=True)
+        return "recommend", (f"Books similar to {query}", True)
     elif intent == "summarize_book":
         query = intent_data.get("query", message)
-        return await _handle_summary(query)
+        await asyncio.to_thread(DEMAND.record, "title", query)
+        return "summary", query
     elif intent == "get_details":
         query = intent_data.get("query", message)
-        return await _handle_details(query)
+        await asyncio.to_thread(DEMAND.record, "title", query)
+        return "details", query
     elif intent == "chit_chat":
         query = intent_data.get("query", message)
-        generic_response = await Runner.run(book_recommendation_agent, f"The user is making small talk: '{query}'. Respond conversationally in your persona as a book lover.")
-        return {"final_output": generic_response.final_output}
+        return "chit_chat", f"The user is making small talk: '{query}'. Respond conversationally in your persona as a book lover."
     else:
-        return {"final_output": "I can help with book recommendations and summaries. What would you like to know?"}
+        return "reply", "I can help with book recommendations and summaries. What would you like to know?"
+
+async def _llm_route(message: str, session_data: dict) -> dict | None:
+    """Asks the BookMasterAgent for the intent JSON. Returns None if its output can't be parsed."""
+    router_prompt = f'User Message: "{message}"\nCurrent Session State: {json.dumps(session_data)}'
+    started = time.perf_counter()
+    router_result = await _run_agent(book_master_agent, router_prompt)
+    ROUTER_STATS.record_llm(time.perf_counter() - started)
+    try:
+        cleaned_output = re.sub(r'```json\s*|\s*```', '', router_result.final_output, flags=re.DOTALL).strip()
+        intent_data = json.loads(cleaned_output)
+    except (json.JSONDecodeError, AttributeError, TypeError):
+        return None
+    return intent_data if isinstance(intent_data, dict) else None
 
 # --- Helper Handlers for different intents ---
 
-async def _handle_recommendations(prompt: str, is_similar: bool):
-    """Calls the recommendation agent and enriches the results."""
+def _genre_mood_query(genre: str, mood: str) -> str:
+    return f"A {mood} {genre} book"
+
+RECOMMENDATION_LINE = re.compile(r"^(.*?)\s*::\s*(.*)", re.MULTILINE)
+NO_RECOMMENDATIONS = "I couldn't find specific recommendations for that, please try another request!"
+NO_DETAILS = "Sorry, I couldn't find any details for '{query}'."
+
+def _recommendation_prompt(prompt: str, is_similar: bool) -> str:
     # If this is a 'similar' request, force the LLM to explain similarities for each book
     if is_similar:
         prompt = (
             prompt.strip() +
             ". Recommend 3 books and for each, explain in detail why it is similar to the reference (theme, tone, plot, characters, or style). The explanation is required for every recommendation."
         )
-    worker_result = await Runner.run(book_recommendation_agent, prompt)
-    enriched_blocks = []
-    matches = re.findall(r"^(.*?)\s*::\s*(.*)", worker_result.final_output, re.MULTILINE)
-    
-    for title, reason in matches:
-        block = await _format_book_block(title.strip(), reason=reason.strip(), is_similar=is_similar)
-        if block:
-            enriched_blocks.append(block)
+    return prompt
+
+# Parsed worker answers, keyed on the routed intent + normalized query. Both "books similar to
+# Harry Potter" and "suggest something like harry potter" route to the same prompt, hence the same key.
+RESPONSE_CACHE = TieredCache("responses", max_size=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL, disk_path=RESPONSE_CACHE_DB)
+
+def _recommendation_key(prompt: str) -> str:
+    return f"recommend:{normalize(prompt)}"
+
+def _summary_key(query: str) -> str:
+    return f"summary:{normalize(query)}"
+
+def _parse_recommendations(text: str) -> list:
+    return [[title.strip(), reason.strip()] for title, reason in RECOMMENDATION_LINE.findall(text)]
+
+async def _recommend(prompt: str, is_similar: bool) -> list:
+    """`[title, reason]` pairs for a recommendation prompt; cache hits skip the LLM."""
+    key = _recommendation_key(prompt)
+    matches = await RESPONSE_CACHE.get_async(key)
+    if matches is None:
+        try:
+            worker_result = await _run_worker(book_recommendation_agent, _recommendation_prompt(prompt, is_similar))
+        except UpstreamUnavailable:
+            matches = await RESPONSE_CACHE.get_stale_async(key)
+            if matches is None:
+                raise
+            return matches
+        matches = _parse_recommendations(worker_result.final_output)
+        if matches:
+            await RESPONSE_CACHE.set_async(key, matches)
+    return matches
+
+async def _summarize(query: str) -> tuple:
+    """Returns `(parsed, raw)`: parsed is (title, summary, moral) or None if the LLM broke format."""
+    key = _summary_key(query)
+    cached = await RESPONSE_CACHE.get_async(key)
+    if cached is not None:
+        return tuple(cached), None
+    try:
+        worker_result = await _run_worker(book_summary_agent, query)
+    except UpstreamUnavailable:
+        stale = await RESPONSE_CACHE.get_stale_async(key)
+        if stale is None:
+            raise
+        return tuple(stale), None
+    parsed = _parse_summary(worker_result.final_output)
+    if parsed is not None:
+        await RESPONSE_CACHE.set_async(key, list(parsed))
+    return parsed, worker_result.final_output
 
-    return {"final_output": "\n".join(enriched_blocks) or "I couldn't find specific recommendations for that, please try another request!"}
+async def _handle_recommendations(prompt: str, is_similar: bool):
+    """Calls the recommendation agent and enriches the results."""
+    matches = await _recommend(prompt, is_similar)
+    enriched_blocks = await _enrich_recommendations(matches, is_similar)
+
+    return {"final_output": "\n".join(enriched_blocks) or NO_RECOMMENDATIONS}
+
+async def _enrich_one(semaphore: asyncio.Semaphore, title: str, reason: str, is_similar: bool) -> str | None:
+    async with semaphore:
+        try:
+            return await asyncio.wait_for(
+                _format_book_block(title, reason=reason, is_similar=is_similar),
+                timeout=ENRICH_TIMEOUT,
+            )
+        except Exception:
+            # A slow or failing lookup must not hold up the other books.
+            record_error("enrich")
+            return render_plain(title, reason=reason, is_similar=is_similar)
+
+async def _enrich_recommendations(matches: list, is_similar: bool) -> list:
+    """Enriches all `(title, reason)` pairs concurrently, keeping the LLM's order."""
+    semaphore = asyncio.Semaphore(ENRICH_CONCURRENCY)
+    blocks = await asyncio.gather(
+        *(_enrich_one(semaphore, title.strip(), reason.strip(), is_similar) for title, reason in matches)
+    )
+    return [block for block in blocks if block]
+
+def _parse_summary(text: str) -> tuple | None:
+    """Extracts (title, summary, moral) from the summary agent's output."""
+    try:
+        title = re.search(r"TITLE::\s*(.*)", text).group(1).strip()
+        summary = re.search(r"SUMMARY::\s*(.*)", text, re.DOTALL).group(1).strip()
+        moral = re.search(r"MORAL::\s*(.*)", text).group(1).strip()
+    except AttributeError:
+        return None
+    # SUMMARY runs to the end of the text, so cut it off where MORAL starts.
+    summary = summary.split("MORAL::")[0].strip()
+    return title, summary, moral
 
 async def _handle_summary(query: str):
     """Calls the summary agent and enriches the result."""
-    worker_result = await Runner.run(book_summary_agent, query)
-    try:
-        title = re.search(r"TITLE::\s*(.*)", worker_result.final_output).group(1).strip()
-        summary = re.search(r"SUMMARY::\s*(.*)", worker_result.final_output, re.DOTALL).group(1).strip()
-        moral = re.search(r"MORAL::\s*(.*)", worker_result.final_output).group(1).strip()
-    except AttributeError:
-        return {"final_output": worker_result.final_output} # Fallback if LLM fails format
+    parsed, raw = await _summarize(query)
+    if parsed is None:
+        return {"final_output": raw} # Fallback if LLM fails format
 
+    title, summary, moral = parsed
     block = await _format_book_block(title, summary=summary, moral=moral)
-    return {"final_output": block or worker_result.final_output}
+    return {"final_output": block or raw or summary}
+
+# --- Warm-up ---
+
+async def prefetch_book(title: str) -> bool:
+    """Loads a title's metadata and its details block into the caches. True if the book was found."""
+    return await _format_book_block(title) is not None
+
+async def prefetch_genre_mood(genre: str, mood: str) -> bool:
+    """Runs (or reuses) the recommendation for a genre/mood pair and renders its book blocks."""
+    matches = await _recommend(_genre_mood_query(genre, mood), is_similar=False)
+    return bool(await _enrich_recommendations(matches, is_similar=False))
+
+# --- Batch Lookups ---
+BATCH_MODES = ("details", "summary", "similar")
+
+def _first_book(books_data: list) -> BookRecord | None:
+    if not books_data or not isinstance(books_data[0], BookRecord):
+        return None  # nothing found, or a single {"error": ...} entry
+    return books_data[0]
+
+async def _batch_item(title: str, author: str, mode: str) -> dict:
+    """One structured batch result. No router: the mode says which worker (if any) to use."""
+    if mode == "details":
+        book = _first_book(await get_book_info_async(title, author))
+        return render_json(book) if book else {"error": f"Sorry, I couldn't find any details for '{title}'."}
+
+    if mode == "summary":
+        parsed, raw = await _summarize(title)
+        if parsed is None:
+            return render_json(_first_book(await get_book_info_async(title, author)), summary=raw)
+        full_title, summary, moral = parsed
+        book = _first_book(await get_book_info_async(full_title))
+        return {"title": full_title, **render_json(book, summary=summary, moral=moral)}
+
+    # similar
+    matches = await _recommend(f"Books similar to {title}", is_similar=True)
+    books = await asyncio.gather(*(get_book_info_async(rec_title) for rec_title, _ in matches))
+    return {"recommendations": [
+        {"title": rec_title, **render_json(_first_book(books_data), reason=reason, is_similar=True)}
+        for (rec_title, reason), books_data in zip(matches, books)
+    ]}
+
+async def lookup_books_batch(items: list) -> list:
+    """
+    Resolves many `(title, author, mode)` items in one go, skipping the LLM router.
+    Duplicate items (same normalized title, author and mode) are looked up once;
+    results come back in input order.
+    """
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+    unique = {}
+    for title, author, mode in items:
+        unique.setdefault((normalize(title), normalize(author) if author else "", mode), (title, author, mode))
+
+    async def run(title: str, author: str, mode: str) -> dict:
+        async with semaphore:
+            try:
+                return await _batch_item(title, author, mode)
+            except UpstreamOverloaded:
+                return {"error": OVERLOADED}
+            except Exception:
+                return {"error": f"Lookup failed for '{title}'."}
+
+    keys = list(unique)
+    results = dict(zip(keys, await asyncio.gather(*(run(*unique[key]) for key in keys))))
+    return [
+        {"query": title, "mode": mode, **results[(normalize(title), normalize(author) if author else "", mode)]}
+        for title, author, mode in items
+    ]
+
+# --- Streaming Handlers ---
+
+async def _stream_worker(agent: Agent, prompt: str):
+    """
+    Yields the worker agent's text deltas as they arrive (not coalesced: a stream can't be shared).
+    Raises UpstreamUnavailable if no event arrives within LLM_TIMEOUT.
+    """
+    with stage("worker_llm"):
+        async with GEMINI.guard():
+            record_upstream("gemini")
+            result = Runner.run_streamed(agent, prompt, run_config=RUN_CONFIG)
+            events = result.stream_events()
+            while True:
+                # LLM_TIMEOUT bounds the wait for each event; a stalled stream raises
+                # TimeoutError, which the guard records as a failure (UpstreamUnavailable).
+                try:
+                    event = await asyncio.wait_for(anext(events), timeout=GEMINI.timeout)
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    result.cancel()
+                    raise
+                if event.type == "raw_response_event" and isinstance(event.data, ResponseTextDeltaEvent):
+                    yield event.data.delta
+    record_tokens(_total_tokens(result))
+
+async def _stream_recommendations(prompt: str, is_similar: bool):
+    """
+    Streams tokens and starts enriching each `Title :: reason` line as soon as it is complete.
+    Each block is sent the moment its enrichment finishes, with `index` = its line in the
+    LLM's list; books that weren't found leave a gap. `done` carries the blocks in line order.
+    """
+    key = _recommendation_key(prompt)
+    cached = await RESPONSE_CACHE.get_async(key)
+    queue = asyncio.Queue()
+    matches = []
+    semaphore = asyncio.Semaphore(ENRICH_CONCURRENCY)
+    blocks = {}  # line -> block
+    tasks = []
+
+    async def enrich(line: int, title: str, reason: str):
+        block = await _enrich_one(semaphore, title, reason, is_similar)
+        if block:
+            blocks[line] = block
+            await queue.put({"event": "block", "index": line, "data": block})
+
+    def schedule(title: str, reason: str):
+        matches.append([title, reason])
+        tasks.append(asyncio.create_task(enrich(len(tasks), title, reason)))
+
+    def schedule_line(line: str):
+        match = RECOMMENDATION_LINE.match(line.strip())
+        if match:
+            schedule(match.group(1).strip(), match.group(2).strip())
+
+    async def pump():
+        buffer = ""
+        try:
+            if cached is not None:
+                for title, reason in cached:
+                    schedule(title.strip(), reason.strip())
+            else:
+                async for delta in _stream_worker(book_recommendation_agent, _recommendation_prompt(prompt, is_similar)):
+                    await queue.put({"event": "token", "data": delta})
+                    buffer += delta
+                    while "\n" in buffer:
+                        line, buffer = buffer.split("\n", 1)
+                        schedule_line(line)
+                schedule_line(buffer)
+            await asyncio.gather(*tasks)
+        finally:
+            await queue.put(None)
+
+    pump_task = asyncio.create_task(pump())
+    try:
+        while (event := await queue.get()) is not None:
+            yield event
+        await pump_task  # re-raise worker failures
+    finally:
+        pump_task.cancel()
+        for task in tasks:
+            task.cancel()
+
+    if matches and cached is None:
+        await RESPONSE_CACHE.set_async(key, matches)
+    yield {"event": "done", "data": "\n".join(blocks[line] for line in sorted(blocks)) or NO_RECOMMENDATIONS}
+
+async def _stream_summary(query: str):
+    key = _summary_key(query)
+    cached = await RESPONSE_CACHE.get_async(key)
+    text = ""
+    if cached is not None:
+        parsed = tuple(cached)
+        text = parsed[1]
+    else:
+        async for delta in _stream_worker(book_summary_agent, query):
+            text += delta
+            yield {"event": "token", "data": delta}
+        parsed = _parse_summary(text)
+        if parsed is not None:
+            await RESPONSE_CACHE.set_async(key, list(parsed))
+
+    block = None
+    if parsed is not None:
+        title, summary, moral = parsed
+        block = await _format_book_block(title, summary=summary, moral=moral)
+        if block:
+            yield {"event": "block", "index": 0, "data": block}
+    yield {"event": "done", "data": block or text}
 
 async def _handle_details(query: str):
     """Handles a direct request for book details."""
     block = await _format_book_block(query)
-    return {"final_output": block or f"Sorry, I couldn't find any details for '{query}'."}
+    return {"final_output": block or NO_DETAILS.format(query=query)}
+
+# Finished Markdown blocks, keyed on everything that goes into them (warm-up fills this too).
+BLOCK_CACHE = LRUCache(max_size=BLOCK_CACHE_SIZE, ttl=min(BLOCK_CACHE_TTL, BOOK_CACHE_TTL))
 
 async def _format_book_block(title: str, author: str = None, reason: str = None, summary: str = None, moral: str = None, is_similar: bool = False) -> str | None:
     """A generic helper to fetch book info and format a beautiful Markdown block."""
-    books_data = get_book_info_raw(title, author)
-    if not books_data:
-        return None  # The refined tool returns [] on failure, so this check is clean and sufficient.
-
-    # The refined tool returns the best match first, so we can confidently use index 0.
-    book = books_data[0]
-
-    final_summary = summary or book.get('description', 'No summary available.')
-    
-    block = f"""---
-### 📘 *{book['title']}*
-![Cover]({book['thumbnail']})
-**✍️ Author**: {book['author']}  
-**⭐ Rating**: {book['rating']}  
-**🏷️ Tag**: {book['tag']}
----"""
-    
-    if reason:
-        reason_header = "🤝 Why It’s Similar" if is_similar else "📖 What It’s About"
-        block += f"\n### {reason_header}\n{reason}\n\n---"
-    
-    if final_summary:
-        block += f"\n### 📝 Summary\n{final_summary}\n\n---"
-
-    if moral:
-        block += f"\n### 🌟 Moral / Takeaway\n{moral}\n\n---"
-
-    block += f"""
-### 🔗 Where to Buy or Read
-• [Amazon]({book['buy_links'][0]})  
-• [Goodreads]({book['buy_links'][1]})  
-• [Bookscape]({book['buy_links'][2]})"""
-
-    return block
\ No newline at end of file
+    key = (book_cache_key(title, author), reason, summary, moral, is_similar)
+    block = BLOCK_CACHE.get(key)
+    if block is not None:
+        return block
+    # The refined tool returns the best match first, or a single {"error": ...} entry on failure.
+    book = _first_book(await get_book_info_async(title, author))
+    if book is None:
+        return None
+    with stage("render"):
+        block = render_markdown(book, reason=reason, summary=summary, moral=moral, is_similar=is_similar)
+    BLOCK_CACHE.set(key, block)
+    return block
@@ -0,0 +1,304 @@
+# bench/run.py
+#
+# Load test for the real FastAPI app against offline upstream stubs.
+#
+#   cd backend
+#   python -m bench.run --requests 200 --concurrency 20 --out bench_results.json
+#
+# The app runs in its own uvicorn process, pointed at bench/stubs.py through
+# GEMINI_BASE_URL and GOOGLE_BOOKS_API_URL. Each intent is replayed as its own
+# phase (so upstream calls can be attributed to it), followed by a mixed phase.
+#
+#   python -m bench.run --scaling 1,2,4 --requests 2000 --concurrency 64
+#
+# instead starts the app through serve.py (shared SQLite state) once per worker count
+# and replays the mixed workload against each, to show how throughput scales. So that
+# the app is the bottleneck rather than the stubs' sleeps, scaling runs default to zero
+# upstream latency, run the stubs in a process of their own, and keep `--concurrency`
+# requests in flight per worker. The load generator still needs a core: give the host
+# at least workers + 2.
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+import uvicorn
+
+from bench.stubs import BOOK_POOL, CallCounter, StubSettings, create_stub_app
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORKLOAD = {
+    "greeting": lambda rng: rng.choice(["hello", "hi there!", "how are you?"]),
+    "recommend_similar": lambda rng: f"Books similar to {rng.choice(BOOK_POOL)}",
+    "recommend_genre_mood": lambda rng: "I want a {} {} book".format(
+        rng.choice(["thoughtful", "adventurous", "relaxing", "dark"]),
+        rng.choice(["sci-fi", "fantasy", "mystery", "romance"]),
+    ),
+    "summarize_book": lambda rng: f"Summarize {rng.choice(BOOK_POOL)}",
+    "get_details": lambda rng: rng.choice(BOOK_POOL),
+    "chit_chat": lambda rng: rng.choice(["Do you like books?", "What's your favorite genre?"]),
+}
+MIX = {"greeting": 1, "recommend_similar": 3, "recommend_genre_mood": 2, "summarize_book": 2, "get_details": 3, "chit_chat": 1}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def start_stubs(settings: StubSettings, counter: CallCounter) -> str:
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(create_stub_app(settings, counter), port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+
+def start_stub_process(settings: StubSettings) -> tuple:
+    """Serves the stubs from a separate process. Returns `(process, url)`."""
+    port = _free_port()
+    command = [sys.executable, "-m", "bench.stubs", "--port", str(port),
+               "--llm-latency", str(settings.llm_latency), "--token-delay", str(settings.token_delay),
+               "--books-latency", str(settings.books_latency), "--llm-error-rate", str(settings.llm_error_rate),
+               "--books-error-rate", str(settings.books_error_rate)]
+    process = subprocess.Popen(command, cwd=BACKEND_DIR)
+    url = f"http://127.0.0.1:{port}"
+    _wait_until_up(process, f"{url}/_stats", "The stubs")
+    return process, url
+
+
+class RemoteCounter:
+    """CallCounter.snapshot for stubs running in another process."""
+
+    def __init__(self, stub_url: str):
+        self.stub_url = stub_url
+
+    def snapshot(self) -> dict:
+        return httpx.get(f"{self.stub_url}/_stats", timeout=5.0).json()
+
+
+def _wait_until_up(process: subprocess.Popen, url: str, what: str):
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"{what} did not start within 30s.")
+
+
+def start_app(stub_url: str, workers: int, extra_env: dict = None, state_dir: str = None) -> tuple:
+    """Starts the app under uvicorn, or through serve.py with shared state when `state_dir` is given."""
+    port = _free_port()
+    env = {
+        **os.environ,
+        "GEMINI_API_KEY": "bench",
+        "GEMINI_BASE_URL": f"{stub_url}/v1beta/openai/",
+        "GOOGLE_BOOKS_API_URL": f"{stub_url}/books/v1/volumes",
+        "OPENAI_AGENTS_DISABLE_TRACING": "1",
+        "CATALOG_DB": "",
+        "DEMAND_DB": "",
+        "WARMUP_ON_STARTUP": "0",
+        **(extra_env or {}),
+    }
+    if state_dir is None:
+        command = [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+                   "--workers", str(workers), "--log-level", "warning"]
+    else:
+        for name in ("CATALOG_DB", "DEMAND_DB"):  # let serve.py put them in the shared directory
+            if name not in (extra_env or {}):
+                env.pop(name)
+        command = [sys.executable, "serve.py", "--port", str(port), "--workers", str(workers),
+                   "--state-dir", state_dir, "--log-level", "warning"]
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env)
+    url = f"http://127.0.0.1:{port}"
+    _wait_until_up(process, f"{url}/stats", "The app")
+    return process, url
+
+
+async def run_phase(url: str, messages: list, concurrency: int) -> dict:
+    latencies, errors = [], 0
+    queue = list(enumerate(messages))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=url, timeout=60.0, limits=limits) as client:
+        async def worker():
+            nonlocal errors
+            while queue:
+                index, message = queue.pop()
+                started = time.perf_counter()
+                try:
+                    response = await client.post("/agent", json={"mode": "chat", "query": message, "user_id": f"bench-{index}"})
+                    if response.status_code != 200 or "reply" not in response.json():
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "requests": len(messages),
+        "errors": errors,
+        "req_per_s": round(len(messages) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(_percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 1),
+    }
+
+
+def _diff(after: dict, before: dict) -> dict:
+    return {key: after[key] - before.get(key, 0) for key in after if after[key] - before.get(key, 0)}
+
+
+async def run_benchmark(url: str, counter: CallCounter, requests: int, concurrency: int, seed: int, intents: list) -> dict:
+    rng = random.Random(seed)
+    phases = {}
+    for intent in intents:
+        before = counter.snapshot()
+        phases[intent] = await run_phase(url, [WORKLOAD[intent](rng) for _ in range(requests)], concurrency)
+        phases[intent]["upstream_calls"] = _diff(counter.snapshot(), before)
+
+    before = counter.snapshot()
+    phases["mixed"] = await run_phase(url, _mixed_workload(rng, requests), concurrency)
+    phases["mixed"]["upstream_calls"] = _diff(counter.snapshot(), before)
+    return phases
+
+
+def _mixed_workload(rng: random.Random, requests: int) -> list:
+    names, weights = zip(*MIX.items())
+    return [WORKLOAD[rng.choices(names, weights)[0]](rng) for _ in range(requests)]
+
+
+def run_scaling(stub_url: str, counter, worker_counts: list, requests: int, concurrency: int,
+                seed: int, app_env: dict) -> dict:
+    """
+    The mixed workload against serve.py with each worker count, each on fresh shared state.
+    `concurrency` is per worker, so a closed-loop client doesn't cap every run at the same rate.
+    """
+    runs = {}
+    for workers in worker_counts:
+        with tempfile.TemporaryDirectory() as state_dir:
+            process, url = start_app(stub_url, workers, app_env, state_dir=state_dir)
+            try:
+                before = counter.snapshot()
+                messages = _mixed_workload(random.Random(seed), requests)
+                result = asyncio.run(run_phase(url, messages, concurrency * workers))
+                result["concurrency"] = concurrency * workers
+                result["upstream_calls"] = _diff(counter.snapshot(), before)
+            finally:
+                process.terminate()
+                process.wait()
+        runs[f"{workers} workers"] = result
+    base = next(iter(runs.values()))["req_per_s"]
+    for workers, result in zip(worker_counts, runs.values()):
+        result["scaling_efficiency"] = round(result["req_per_s"] / (base * workers / worker_counts[0]), 2) if base else 0.0
+    return runs
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_table(phases: dict):
+    print(f"{'phase':<22}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}  upstream calls")
+    for name, result in phases.items():
+        calls = ", ".join(f"{k}={v}" for k, v in sorted(result["upstream_calls"].items()))
+        if "scaling_efficiency" in result:
+            calls = f"efficiency={result['scaling_efficiency']}  {calls}"
+        print(f"{name:<22}{result['req_per_s']:>9}{result['p50_ms']:>10}{result['p95_ms']:>10}"
+              f"{result['p99_ms']:>10}{result['errors']:>8}  {calls}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the books agent against offline upstream stubs.")
+    parser.add_argument("--requests", type=int, default=100, help="requests per phase")
+    parser.add_argument("--concurrency", type=int, default=10, help="requests in flight (scaling: per worker)")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes for the app")
+    parser.add_argument("--llm-latency", type=float, help="seconds before the first token (default 0.4; scaling: 0)")
+    parser.add_argument("--token-delay", type=float, help="seconds between streamed tokens (default 0.01; scaling: 0)")
+    parser.add_argument("--books-latency", type=float, help="seconds per Google Books call (default 0.08; scaling: 0)")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="share of LLM calls answered with 503")
+    parser.add_argument("--books-error-rate", type=float, default=0.0, help="share of Google Books calls answered with 503")
+    parser.add_argument("--llm-rate-limit", help="app's LLM_RATE_LIMIT (runs/s, 0 = unlimited); default: app default")
+    parser.add_argument("--books-rate-limit", help="app's BOOK_API_RATE_LIMIT (requests/s, 0 = unlimited)")
+    parser.add_argument("--scaling", help="comma-separated worker counts: run the mixed workload via serve.py for each")
+    parser.add_argument("--intents", default=",".join(WORKLOAD), help="comma-separated phases to run before the mix")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", help="write machine-readable results to this JSON file")
+    args = parser.parse_args()
+
+    # Scaling runs default to instant upstreams, so the app's own CPU time is what gets measured.
+    defaults = (0.0, 0.0, 0.0) if args.scaling else (0.4, 0.01, 0.08)
+    latencies = [default if value is None else value
+                 for value, default in zip((args.llm_latency, args.token_delay, args.books_latency), defaults)]
+    args.llm_latency, args.token_delay, args.books_latency = latencies
+    settings = StubSettings(*latencies, args.llm_error_rate, args.books_error_rate)
+    app_env = {}
+    if args.llm_rate_limit is not None:
+        app_env["LLM_RATE_LIMIT"] = args.llm_rate_limit
+    if args.books_rate_limit is not None:
+        app_env["BOOK_API_RATE_LIMIT"] = args.books_rate_limit
+    if args.scaling:
+        # Per-process rate limits would cap throughput at the same total for every worker count.
+        app_env = {"LLM_RATE_LIMIT": "0", "BOOK_API_RATE_LIMIT": "0", **app_env}
+        worker_counts = [int(n) for n in args.scaling.split(",")]
+        stubs, stub_url = start_stub_process(settings)
+        try:
+            phases = run_scaling(stub_url, RemoteCounter(stub_url), worker_counts, args.requests, args.concurrency,
+                                 args.seed, app_env)
+        finally:
+            stubs.terminate()
+            stubs.wait()
+    else:
+        counter = CallCounter()
+        stub_url = start_stubs(settings, counter)
+        process, url = start_app(stub_url, args.workers, app_env)
+        try:
+            intents = [intent for intent in args.intents.split(",") if intent]
+            phases = asyncio.run(run_benchmark(url, counter, args.requests, args.concurrency, args.seed, intents))
+        finally:
+            process.terminate()
+            process.wait()
+
+    print_table(phases)
+    if args.out:
+        results = {
+            "commit": _git_commit(),
+            "settings": {k: v for k, v in vars(args).items() if k != "out"},
+            "phases": phases,
+        }
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nWrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
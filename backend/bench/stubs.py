@@ -0,0 +1,205 @@
+# bench/stubs.py
+#
+# Offline stand-ins for the two upstreams the backend talks to:
+#   - the OpenAI-compatible Gemini chat endpoint used through AsyncOpenAI
+#   - the Google Books volumes API
+# Both answer deterministically after a configurable delay and count every call.
+# bench/run.py serves them from a thread of its own process, or (scaling runs) as
+#
+#   python -m bench.stubs --port 9000 --llm-latency 0 --token-delay 0 --books-latency 0
+#
+# so the stubs don't compete with the load generator for one interpreter.
+
+import asyncio
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+BOOK_POOL = [
+    "Dune", "The Hobbit", "Pride and Prejudice", "Harry Potter and the Sorcerer's Stone", "The Hunger Games",
+    "Percy Jackson and the Lightning Thief", "Foundation", "Hyperion", "Neuromancer", "The Name of the Wind",
+    "Mistborn", "Circe", "The Night Circus", "Project Hail Mary", "The Martian", "Rebecca", "Gone Girl",
+    "The Silent Patient", "Educated", "Sapiens", "The Road", "Beloved", "Emma", "Jane Eyre",
+]
+
+
+class StubSettings:
+    """Latencies in seconds and error rates (0..1, answered with HTTP 503) for each upstream."""
+
+    def __init__(self, llm_latency: float = 0.4, token_delay: float = 0.01, books_latency: float = 0.08,
+                 llm_error_rate: float = 0.0, books_error_rate: float = 0.0):
+        self.llm_latency = llm_latency
+        self.token_delay = token_delay
+        self.books_latency = books_latency
+        self.llm_error_rate = llm_error_rate
+        self.books_error_rate = books_error_rate
+
+
+class CallCounter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+
+    def add(self, name: str):
+        with self._lock:
+            self._counts[name] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._counts)
+
+
+def _pick(seed: str, count: int) -> list:
+    start = int(hashlib.md5(seed.encode()).hexdigest(), 16) % len(BOOK_POOL)
+    return [BOOK_POOL[(start + i) % len(BOOK_POOL)] for i in range(count)]
+
+
+def _route(user_message: str) -> dict:
+    """A rough copy of what the real router answers for the bench workload."""
+    text = user_message.lower()
+    if re.match(r"^(hi|hello|hey|how are you|goodbye)\b", text):
+        return {"intent": "greeting", "confidence_score": 1.0}
+    similar = re.search(r"(?:similar to|something like|books like)\s+(.+)$", user_message, re.IGNORECASE)
+    if similar:
+        return {"intent": "recommend_similar", "query": similar.group(1).strip(" ?!."), "confidence_score": 1.0}
+    summary = re.search(r"(?:summari[sz]e|story of|summary of)\s+(.+)$", user_message, re.IGNORECASE)
+    if summary:
+        return {"intent": "summarize_book", "query": summary.group(1).strip(" ?!.'"), "confidence_score": 1.0}
+    if text.endswith("?"):
+        return {"intent": "chit_chat", "query": user_message, "confidence_score": 0.8}
+    return {"intent": "get_details", "query": user_message, "confidence_score": 0.85}
+
+
+def _completion_text(messages: list) -> tuple:
+    """Returns (agent kind, reply text) based on which agent's instructions are in the system message."""
+    system = next((m.get("content") or "" for m in messages if m.get("role") == "system"), "")
+    user = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+    if isinstance(user, list):
+        user = " ".join(part.get("text", "") for part in user if isinstance(part, dict))
+
+    if "master routing agent" in system:
+        match = re.search(r'User Message: "(.*)"', user)
+        return "router", json.dumps(_route(match.group(1) if match else user))
+    if "master storyteller" in system:
+        title = _route(f"summarize {user}").get("query") or user
+        return "summary", (
+            f"TITLE:: {title}\n"
+            f"SUMMARY:: {title} follows an unlikely hero through a world that tests them at every turn. "
+            "Along the way friendships are forged and loyalties questioned.\n\n"
+            "As the stakes rise, the hero must decide what they are willing to lose.\n"
+            "MORAL:: Courage is a choice made again every day."
+        )
+    if "user is making small talk" in user:
+        return "chit_chat", "I love books! Every one of them is a little world of its own. What are you reading lately?"
+    lines = [f"{title} :: A gripping read that matches the tone and themes you asked for." for title in _pick(user, 3)]
+    return "recommendation", "\n".join(lines)
+
+
+def _usage(prompt: str, completion: str) -> dict:
+    prompt_tokens, completion_tokens = len(prompt) // 4, len(completion) // 4
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens}
+
+
+def _volume(title: str, index: int) -> dict:
+    digest = hashlib.md5(f"{title}{index}".encode()).hexdigest()
+    return {"volumeInfo": {
+        "title": title if index == 0 else f"{title}: Companion Volume {index}",
+        "authors": ["Stub Author"],
+        "description": f"A description of {title}.",
+        "averageRating": 3.5 + int(digest[:2], 16) / 170,
+        "publishedDate": "1965" if int(digest[2], 16) % 2 else "2015",
+        "imageLinks": {"thumbnail": f"https://covers.example/{digest[:8]}.jpg"},
+        "industryIdentifiers": [{"type": "ISBN_13", "identifier": str(int(digest[:12], 16))[:13]}],
+    }}
+
+
+def create_stub_app(settings: StubSettings, counter: CallCounter) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/v1beta/openai/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        kind, text = _completion_text(body.get("messages", []))
+        counter.add(f"llm:{kind}")
+        prompt = json.dumps(body.get("messages", []))
+        created = int(time.time())
+        await asyncio.sleep(settings.llm_latency)
+        if random.random() < settings.llm_error_rate:
+            counter.add("llm:error")
+            return JSONResponse({"error": {"message": "stub outage", "code": 503}}, status_code=503)
+
+        if not body.get("stream"):
+            return {
+                "id": "chatcmpl-stub", "object": "chat.completion", "created": created, "model": body.get("model"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": text}}],
+                "usage": _usage(prompt, text),
+            }
+
+        async def chunks():
+            def chunk(delta: dict, finish_reason=None, usage=None):
+                payload = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": created,
+                           "model": body.get("model"),
+                           "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+                if usage:
+                    payload["usage"] = usage
+                return f"data: {json.dumps(payload)}\n\n"
+
+            yield chunk({"role": "assistant", "content": ""})
+            for piece in re.findall(r"\S+\s*", text):
+                await asyncio.sleep(settings.token_delay)
+                yield chunk({"content": piece})
+            yield chunk({}, finish_reason="stop", usage=_usage(prompt, text))
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(chunks(), media_type="text/event-stream")
+
+    @app.get("/books/v1/volumes")
+    async def volumes(q: str = "", maxResults: int = 5):
+        counter.add("books:volumes")
+        await asyncio.sleep(settings.books_latency)
+        if random.random() < settings.books_error_rate:
+            counter.add("books:error")
+            return JSONResponse({"error": {"message": "stub outage", "code": 503}}, status_code=503)
+        title = q.split(" inauthor:")[0].strip()
+        if not title or title.lower().startswith("zzz"):
+            return {"kind": "books#volumes", "totalItems": 0}
+        return {"kind": "books#volumes", "totalItems": maxResults,
+                "items": [_volume(title, i) for i in range(maxResults)]}
+
+    @app.get("/_stats")
+    async def stats():
+        return counter.snapshot()
+
+    return app
+
+
+def main():
+    import argparse
+
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve the upstream stubs on their own.")
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--llm-latency", type=float, default=0.4)
+    parser.add_argument("--token-delay", type=float, default=0.01)
+    parser.add_argument("--books-latency", type=float, default=0.08)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--books-error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    settings = StubSettings(args.llm_latency, args.token_delay, args.books_latency,
+                            args.llm_error_rate, args.books_error_rate)
+    uvicorn.run(create_stub_app(settings, CallCounter()), port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+# books.py
+
+import urllib.parse
+import zlib
+from dataclasses import dataclass, field
+
+from utils import normalize
+
+# The only parts of a Google Books response BookRecord.from_volume reads (sent as `fields=`).
+VOLUME_FIELDS = (
+    "items/volumeInfo(title,authors,description,averageRating,publishedDate,"
+    "imageLinks(thumbnail,smallThumbnail),industryIdentifiers)"
+)
+
+BUY_LINK_TEMPLATES = (
+    "https://www.amazon.com/s?k={}",
+    "https://www.goodreads.com/search?q={}",
+    "https://www.bookscape.co/search?q={}",
+)
+
+
+@dataclass(slots=True)
+class BookRecord:
+    """
+    One book as we show it. Normalized title/author and the buy links are derived on
+    first use; `to_dict` is the JSON shape used by the caches, the catalog and the API.
+    """
+    title: str
+    author: str
+    description: str
+    rating: float
+    tag: str
+    thumbnail: str
+    isbn: str | None = None
+    _norm_title: str | None = field(default=None, init=False, repr=False, compare=False)
+    _norm_author: str | None = field(default=None, init=False, repr=False, compare=False)
+    _buy_links: tuple | None = field(default=None, init=False, repr=False, compare=False)
+
+    @classmethod
+    def from_volume(cls, book_info: dict, query_title: str) -> "BookRecord":
+        """Builds a record from one item's `volumeInfo`, with fallbacks for whatever is missing."""
+        title = book_info.get("title")
+        image_links = book_info.get("imageLinks", {})
+        thumbnail = (
+            image_links.get("thumbnail") or
+            image_links.get("smallThumbnail") or
+            f"https://covers.openlibrary.org/b/title/{(title or query_title).replace(' ', '%20')}-L.jpg"
+        )
+        description = book_info.get("description", "No description available.")
+        rating = book_info.get("averageRating")
+        if rating is None:
+            rating = fallback_rating(title or query_title)
+        published = book_info.get("publishedDate", "")
+        tag = "Trending"
+        if published and published[:4].isdigit() and int(published[:4]) < 2000:
+            tag = "Classic"
+        elif "underrated" in description.lower() or "hidden gem" in description.lower():
+            tag = "Hidden Gem"
+        isbn = next(
+            (iden.get("identifier") for iden in book_info.get("industryIdentifiers", ())
+             if iden.get("type") in ("ISBN_13", "ISBN_10")),
+            None,
+        )
+        return cls(
+            title=title or "N/A",
+            author=", ".join(book_info.get("authors", ["Unknown Author"])),
+            description=description,
+            rating=rating,
+            tag=tag,
+            thumbnail=thumbnail,
+            isbn=isbn,
+        )
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "BookRecord":
+        return cls(
+            title=data["title"],
+            author=data["author"],
+            description=data.get("description", "No description available."),
+            rating=data["rating"],
+            tag=data["tag"],
+            thumbnail=data["thumbnail"],
+            isbn=data.get("isbn"),
+        )
+
+    @property
+    def norm_title(self) -> str:
+        if self._norm_title is None:
+            self._norm_title = normalize(self.title)
+        return self._norm_title
+
+    @property
+    def norm_author(self) -> str:
+        if self._norm_author is None:
+            self._norm_author = normalize(self.author)
+        return self._norm_author
+
+    @property
+    def key(self) -> str:
+        """Catalog key: normalized title and author."""
+        return f"{self.norm_title}|{self.norm_author}"
+
+    @property
+    def buy_links(self) -> tuple:
+        """Amazon, Goodreads and Bookscape search links."""
+        if self._buy_links is None:
+            quoted = urllib.parse.quote_plus(self.title)
+            self._buy_links = tuple(template.format(quoted) for template in BUY_LINK_TEMPLATES)
+        return self._buy_links
+
+    def to_dict(self) -> dict:
+        return {
+            "title": self.title,
+            "author": self.author,
+            "description": self.description,
+            "rating": self.rating,
+            "tag": self.tag,
+            "thumbnail": self.thumbnail,
+            "isbn": self.isbn,
+            "buy_links": list(self.buy_links),
+        }
+
+
+def fallback_rating(title: str) -> float:
+    """A stable 3.5-5.0 stand-in for books without a rating, so cached and fresh answers agree."""
+    return round(3.5 + zlib.crc32(title.encode()) % 16 / 10, 1)
+
+
+def encode_books(books: list) -> list:
+    """Lookup result -> JSON-friendly list (error entries are already plain dicts)."""
+    return [book.to_dict() if isinstance(book, BookRecord) else book for book in books]
+
+
+def decode_books(rows: list) -> list:
+    return [row if "error" in row else BookRecord.from_dict(row) for row in rows]
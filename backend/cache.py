@@ -0,0 +1,276 @@
+# cache.py
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import record_error
+
+CACHE_DISK_MAX_ROWS = int(os.getenv("CACHE_DISK_MAX_ROWS", "100000"))  # rows per disk-tier table
+CACHE_STALE_GRACE = float(os.getenv("CACHE_STALE_GRACE", "86400"))     # seconds expired rows stay for get_stale
+
+
+class LRUCache:
+    """
+    In-process cache with a size bound, least-recently-used eviction and per-entry TTL.
+    Expired entries stay until evicted so `get_stale` can serve them while an upstream is down.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 3600.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def get_stale(self, key: str):
+        """Returns the entry even if it has expired."""
+        with self._lock:
+            entry = self._data.get(key)
+            return entry[1] if entry else None
+
+    def set(self, key: str, value, ttl: float = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteCache:
+    """
+    On-disk cache tier that survives restarts. Values must be JSON-serialisable.
+    Every `prune_every` writes, rows that expired more than `stale_grace` seconds ago are
+    deleted (younger ones still serve `get_stale`), then the table is cut to `max_rows`,
+    dropping the entries closest to expiry. The file is opened on first use (or by `open`),
+    not when the cache is built, so importing a module that defines one touches no disk.
+    """
+
+    def __init__(self, path: str, table: str = "cache", ttl: float = 3600.0, max_rows: int = CACHE_DISK_MAX_ROWS,
+                 stale_grace: float = CACHE_STALE_GRACE, prune_every: int = 500):
+        self.path = path
+        self.table = table
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self.stale_grace = stale_grace
+        self.prune_every = prune_every
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def open(self):
+        with self._lock:
+            self._open()
+
+    def _open(self):
+        if self._conn is not None:
+            return
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_expires_at ON {self.table} (expires_at)")
+        self._conn = conn
+
+    def get(self, key: str):
+        entry = self.get_entry(key)
+        return entry[0] if entry else None
+
+    def get_entry(self, key: str):
+        """Returns `(value, seconds_left)` for a live entry, else None."""
+        with self._lock:
+            self._open()
+            row = self._conn.execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        seconds_left = expires_at - time.time()
+        if seconds_left <= 0:
+            return None
+        return json.loads(value), seconds_left
+
+    def get_stale(self, key: str):
+        with self._lock:
+            self._open()
+            row = self._conn.execute(f"SELECT value FROM {self.table} WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key: str, value, ttl: float = None):
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._open()
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), expires_at),
+            )
+            self._writes += 1
+            if self._writes % self.prune_every == 0:
+                self._prune(self.stale_grace)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._open()
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def prune(self, grace: float = 0.0):
+        """Drops rows that expired more than `grace` seconds ago, then any beyond `max_rows`."""
+        with self._lock:
+            self._open()
+            self._prune(grace)
+
+    def _prune(self, grace: float):
+        self._conn.execute(f"DELETE FROM {self.table} WHERE expires_at < ?", (time.time() - grace,))
+        self._conn.execute(
+            f"DELETE FROM {self.table} WHERE key IN "
+            f"(SELECT key FROM {self.table} ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_rows,),
+        )
+
+
+class TieredCache:
+    """
+    Memory-first cache with an optional disk tier behind it.
+    Disk hits are promoted into memory; writes go to both tiers. The disk tier is best effort:
+    a database that stays locked past the busy timeout reads as a miss and skips the write.
+    Async code uses the `*_async` methods, which keep the SQLite calls off the event loop.
+    `encode` / `decode` convert values to and from JSON-friendly data for the disk tier only,
+    so the memory tier can hold richer objects.
+    """
+
+    def __init__(self, name: str, max_size: int = 1024, ttl: float = 3600.0, disk_path: str = None,
+                 encode=None, decode=None):
+        self.name = name
+        self.ttl = ttl
+        self.encode = encode or (lambda value: value)
+        self.decode = decode or (lambda value: value)
+        self.memory = LRUCache(max_size=max_size, ttl=ttl)
+        self.disk = SQLiteCache(disk_path, table=name, ttl=ttl) if disk_path else None
+        self.hits = {"memory": 0, "disk": 0}
+        self.misses = 0
+        self.stale_hits = 0
+
+    def open(self):
+        """Opens the disk tier, if there is one, ahead of the first request."""
+        if self.disk is not None:
+            self.disk.open()
+
+    def get(self, key: str):
+        value = self._get_memory(key)
+        if value is None and self.disk is not None:
+            return self._get_disk(key)
+        return value
+
+    async def get_async(self, key: str):
+        """`get` for the event loop: memory hits stay inline, the disk read runs in a worker thread."""
+        value = self._get_memory(key)
+        if value is None and self.disk is not None:
+            return await asyncio.to_thread(self._get_disk, key)
+        return value
+
+    def _get_memory(self, key: str):
+        value = self.memory.get(key)
+        if value is not None:
+            self.hits["memory"] += 1
+        elif self.disk is None:
+            self.misses += 1
+        return value
+
+    def _get_disk(self, key: str):
+        try:
+            entry = self.disk.get_entry(key)
+        except sqlite3.OperationalError:  # locked past the busy timeout: treat it as a miss
+            record_error(f"{self.name}_cache")
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        value, seconds_left = entry
+        value = self.decode(value)
+        self.hits["disk"] += 1
+        self.memory.set(key, value, ttl=seconds_left)
+        return value
+
+    def get_stale(self, key: str):
+        """Last known value regardless of TTL; used as a fallback when the upstream is unavailable."""
+        value = self.memory.get_stale(key)
+        if value is None and self.disk is not None:
+            value = self._get_stale_disk(key)
+        return self._count_stale(value)
+
+    async def get_stale_async(self, key: str):
+        value = self.memory.get_stale(key)
+        if value is None and self.disk is not None:
+            value = await asyncio.to_thread(self._get_stale_disk, key)
+        return self._count_stale(value)
+
+    def _get_stale_disk(self, key: str):
+        try:
+            value = self.disk.get_stale(key)
+        except sqlite3.OperationalError:
+            record_error(f"{self.name}_cache")
+            return None
+        return self.decode(value) if value is not None else None
+
+    def _count_stale(self, value):
+        if value is not None:
+            self.stale_hits += 1
+        return value
+
+    def set(self, key: str, value, ttl: float = None):
+        self.memory.set(key, value, ttl)
+        if self.disk is not None:
+            self._set_disk(key, value, ttl)
+
+    async def set_async(self, key: str, value, ttl: float = None):
+        self.memory.set(key, value, ttl)
+        if self.disk is not None:
+            await asyncio.to_thread(self._set_disk, key, value, ttl)
+
+    def _set_disk(self, key: str, value, ttl: float = None):
+        # Best effort: the memory tier already has the value, so a busy database only costs a disk copy.
+        try:
+            self.disk.set(key, self.encode(value), ttl)
+        except sqlite3.OperationalError:
+            record_error(f"{self.name}_cache")
+
+    def delete(self, key: str):
+        self.memory.delete(key)
+        if self.disk is not None:
+            self.disk.delete(key)
+
+    def stats(self) -> dict:
+        hits = self.hits["memory"] + self.hits["disk"]
+        total = hits + self.misses
+        return {
+            "hits": dict(self.hits),
+            "misses": self.misses,
+            "stale_hits": self.stale_hits,
+            "hit_ratio": round(hits / total, 4) if total else 0.0,
+            "size": len(self.memory),
+        }
@@ -0,0 +1,298 @@
+# catalog.py
+
+import bisect
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from books import BookRecord
+from metrics import record_error
+from utils import normalize
+
+CATALOG_DB = os.getenv("CATALOG_DB")  # optional SQLite file; unset keeps the catalog in memory only
+CATALOG_MIN_PREFIX = int(os.getenv("CATALOG_MIN_PREFIX", "4"))          # normalized chars before prefix search kicks in
+CATALOG_FUZZY_THRESHOLD = float(os.getenv("CATALOG_FUZZY_THRESHOLD", "0.7"))  # trigram Dice similarity
+CATALOG_LENGTH_RATIO = float(os.getenv("CATALOG_LENGTH_RATIO", "0.8"))  # shorter/longer title length for near matches
+CATALOG_SYNC_INTERVAL = float(os.getenv("CATALOG_SYNC_INTERVAL", "1.0"))  # min seconds between pulls of other workers' rows
+CATALOG_MAX_BOOKS = int(os.getenv("CATALOG_MAX_BOOKS", "50000"))      # least recently used books go past this
+CATALOG_MAX_RESULTS = 5
+
+
+def _trigrams(text: str) -> set:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _close_length(title: str, candidate: str) -> bool:
+    shorter, longer = sorted((len(title), len(candidate)))
+    return shorter >= CATALOG_LENGTH_RATIO * longer
+
+
+class BookCatalog:
+    """
+    Local index of the books the Google Books API has returned to us.
+    Records are the BookRecords `get_book_info_async` produces. Lookups run entirely in
+    memory: `lookup` only answers with the book the API ranked first when asked for exactly
+    that title, and `closest` adds prefix and trigram fuzzy matches for typos once the API
+    has come back empty. At most `max_books` are kept, least recently used go first.
+    The optional SQLite file makes the index survive restarts and lets worker processes
+    sharing the file pick up each other's books on a local miss.
+    """
+
+    def __init__(self, path: str = None, max_books: int = CATALOG_MAX_BOOKS):
+        self._lock = threading.Lock()
+        self.max_books = max_books
+        self._records = OrderedDict()  # key -> BookRecord, least recently used first
+        self._by_title = {}     # normalized title -> [key, ...]
+        self._top = {}          # normalized title -> key of the API's top result for exactly that title
+        self._titles = []       # sorted normalized titles, for prefix search
+        self._trigram_index = {}  # trigram -> {normalized title, ...}
+        self._gram_counts = {}    # normalized title -> number of distinct trigrams
+        self.hits = {"exact": 0, "prefix": 0, "fuzzy": 0}
+        self.misses = 0
+        self.evicted = 0
+        self.synced = 0         # rows picked up from other processes
+        self._synced_until = 0.0  # newest added_at indexed from the file (books)
+        self._top_synced_until = 0.0  # and from top_results
+        self._last_sync = 0.0
+        self._writes = 0
+        self.path = path
+        self._conn = None
+        self._opened = False
+
+    def open(self):
+        """Opens the SQLite file, if any, and indexes what it holds. The first lookup or add does it too."""
+        with self._lock:
+            self._open()
+
+    def _open(self):
+        if self._opened:
+            return
+        self._opened = True
+        if not self.path:
+            return
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS books (key TEXT PRIMARY KEY, data TEXT NOT NULL, added_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS books_added_at ON books (added_at)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS top_results (title TEXT PRIMARY KEY, key TEXT NOT NULL, added_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS top_results_added_at ON top_results (added_at)")
+        # Newest rows only, indexed oldest first so the newest end up most recently used.
+        rows = self._conn.execute(
+            "SELECT key, data, added_at FROM books ORDER BY added_at DESC LIMIT ?", (self.max_books,)
+        ).fetchall()
+        for key, data, added_at in reversed(rows):
+            self._index(key, BookRecord.from_dict(json.loads(data)))
+            self._synced_until = max(self._synced_until, added_at)
+        self._apply_top(self._conn.execute("SELECT title, key, added_at FROM top_results").fetchall())
+
+    @staticmethod
+    def key_for(book: BookRecord) -> str:
+        return book.key
+
+    def _index(self, key: str, book: BookRecord):
+        title = book.norm_title
+        if not title:
+            return
+        self._records[key] = book
+        self._records.move_to_end(key)
+        keys = self._by_title.get(title)
+        if keys is None:
+            self._by_title[title] = [key]
+            bisect.insort(self._titles, title)
+            grams = _trigrams(title)
+            self._gram_counts[title] = len(grams)
+            for gram in grams:
+                self._trigram_index.setdefault(gram, set()).add(title)
+        elif key not in keys:
+            keys.append(key)
+
+    def _apply_top(self, rows: list):
+        for title, key, added_at in rows:
+            if key in self._records:
+                self._top[title] = key
+            self._top_synced_until = max(self._top_synced_until, added_at)
+
+    def _trim(self):
+        # Lock held. Cut to 90% of the bound so the prefix list is rebuilt once per max_books/10 adds.
+        if len(self._records) <= self.max_books:
+            return
+        while len(self._records) > int(self.max_books * 0.9):
+            key, book = self._records.popitem(last=False)
+            title = book.norm_title
+            if self._top.get(title) == key:
+                del self._top[title]
+            keys = self._by_title[title]
+            keys.remove(key)
+            if not keys:
+                del self._by_title[title]
+                del self._gram_counts[title]
+                for gram in _trigrams(title):
+                    titles = self._trigram_index[gram]
+                    titles.discard(title)
+                    if not titles:
+                        del self._trigram_index[gram]
+            self.evicted += 1
+        self._titles = sorted(self._by_title)
+
+    def add_many(self, books: list, query_title: str = None):
+        """
+        Indexes (and persists, best effort) every BookRecord; error entries are ignored.
+        `books` is the API's answer for `query_title`: if its first book has exactly that
+        title, `lookup` may answer with it from now on.
+        """
+        books = [book for book in books if isinstance(book, BookRecord) and book.title]
+        now = time.time()
+        rows = [(self.key_for(book), json.dumps(book.to_dict()), now) for book in books]
+        query = normalize(query_title) if query_title else None
+        top = (query, self.key_for(books[0]), now) if books and query and books[0].norm_title == query else None
+        with self._lock:
+            self._open()
+            for book in books:
+                self._index(self.key_for(book), book)
+            if top:
+                self._top[query] = top[1]
+            self._trim()
+            if self._conn is not None and rows:
+                try:
+                    self._conn.executemany("INSERT OR REPLACE INTO books (key, data, added_at) VALUES (?, ?, ?)", rows)
+                    if top:
+                        self._conn.execute("INSERT OR REPLACE INTO top_results (title, key, added_at) VALUES (?, ?, ?)", top)
+                    self._writes += 1
+                    if self._writes % 500 == 0:  # keep the file to the same bound now and then
+                        self._prune_file()
+                except sqlite3.OperationalError:  # busy past the timeout: still indexed here, just not shared
+                    record_error("catalog")
+
+    def _prune_file(self):
+        self._conn.execute(
+            "DELETE FROM books WHERE key IN (SELECT key FROM books ORDER BY added_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_books,),
+        )
+        self._conn.execute("DELETE FROM top_results WHERE key NOT IN (SELECT key FROM books)")
+
+    def lookup(self, book_title: str, author: str = None) -> list:
+        """
+        `[book]` if the API's top result for exactly this title is indexed (and matches `author`,
+        if given), else [] and the caller asks the API.
+        """
+        title = normalize(book_title)
+        if not title:
+            return []
+        with self._lock:
+            self._open()
+            book = self._top_book(title, author)
+            if book is None and self._sync():
+                book = self._top_book(title, author)
+        if book is not None:
+            self.hits["exact"] += 1
+            return [book]
+        self.misses += 1
+        return []
+
+    def closest(self, book_title: str, author: str = None) -> list:
+        """
+        Near matches (prefix, then trigram fuzzy) for when the API has nothing better.
+        "Dune" completes to "Dune Messiah", so this is never an answer on its own; titles
+        much longer or shorter than the query are skipped.
+        """
+        title = normalize(book_title)
+        if not title:
+            return []
+        with self._lock:
+            self._open()
+            for kind, search in (("prefix", self._prefix), ("fuzzy", self._fuzzy)):
+                candidates = [candidate for candidate in search(title) if _close_length(title, candidate)]
+                books = self._books_for(candidates, author)
+                if books:
+                    self.hits[kind] += 1
+                    return books
+        return []
+
+    def _top_book(self, title: str, author: str = None) -> BookRecord | None:
+        key = self._top.get(title)
+        if key is None:
+            return None
+        book = self._records[key]
+        if author and normalize(author) not in book.norm_author:
+            return None
+        self._records.move_to_end(key)
+        return book
+
+    def _sync(self) -> bool:
+        """Indexes rows other processes wrote since the last pull (lock held). True if any arrived."""
+        now = time.monotonic()
+        if self._conn is None or now - self._last_sync < CATALOG_SYNC_INTERVAL:
+            return False
+        self._last_sync = now
+        # A few seconds of overlap: another worker's row may commit after a later timestamp we already saw.
+        try:
+            rows = self._conn.execute(
+                "SELECT key, data, added_at FROM books WHERE added_at > ?", (self._synced_until - 5.0,)
+            ).fetchall()
+            top_rows = self._conn.execute(
+                "SELECT title, key, added_at FROM top_results WHERE added_at > ?", (self._top_synced_until - 5.0,)
+            ).fetchall()
+        except sqlite3.OperationalError:
+            record_error("catalog")
+            return False
+        fresh = [(key, data) for key, data, _ in rows if key not in self._records]
+        for key, data in fresh:
+            self._index(key, BookRecord.from_dict(json.loads(data)))
+        if rows:
+            self._synced_until = max(added_at for _, _, added_at in rows)
+        known = dict(self._top)
+        self._apply_top(top_rows)
+        self._trim()
+        self.synced += len(fresh)
+        return bool(fresh) or self._top != known
+
+    def _books_for(self, titles: list, author: str = None) -> list:
+        wanted_author = normalize(author) if author else None
+        books = []
+        for title in titles:
+            for key in self._by_title[title]:
+                book = self._records[key]
+                if wanted_author and wanted_author not in book.norm_author:
+                    continue
+                books.append(book)
+                if len(books) == CATALOG_MAX_RESULTS:
+                    return books
+        return books
+
+    def _prefix(self, title: str) -> list:
+        if len(title) < CATALOG_MIN_PREFIX:
+            return []
+        matches = []
+        i = bisect.bisect_left(self._titles, title)
+        while i < len(self._titles) and self._titles[i].startswith(title):
+            matches.append(self._titles[i])
+            i += 1
+        return sorted(matches, key=len)  # the shortest completion is the closest one
+
+    def _fuzzy(self, title: str) -> list:
+        grams = _trigrams(title)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._trigram_index.get(gram, ()))
+        scored = []
+        for candidate, common in shared.items():
+            score = 2 * common / (len(grams) + self._gram_counts[candidate])  # Dice coefficient
+            if score >= CATALOG_FUZZY_THRESHOLD:
+                scored.append((score, candidate))
+        scored.sort(reverse=True)
+        return [candidate for _, candidate in scored]
+
+    def stats(self) -> dict:
+        return {"books": len(self._records), "hits": dict(self.hits), "misses": self.misses,
+                "evicted": self.evicted, "synced": self.synced}
+
+
+CATALOG = BookCatalog(CATALOG_DB)  # loaded on first use, or by the server at startup
@@ -0,0 +1,108 @@
+# demand.py
+
+import heapq
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+from metrics import record_error
+from utils import normalize
+
+DEMAND_DB = os.getenv("DEMAND_DB")  # optional SQLite file; unset keeps the counts in memory only
+DEMAND_MAX = int(os.getenv("DEMAND_MAX", "10000"))  # distinct values kept; the least requested go first
+
+
+class DemandLog:
+    """
+    Counts what users ask for (book titles, genre|mood pairs) so the warm-up job can
+    prefetch the most popular ones after a restart. Values are grouped on their
+    normalized form; the most recent spelling is the one that gets replayed.
+    At most `max_size` values are kept: past that, the least requested (oldest first
+    among equals) are dropped, in memory and in the SQLite table alike.
+    """
+
+    def __init__(self, path: str = None, max_size: int = DEMAND_MAX):
+        self.path = path
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._counts = Counter()  # (kind, normalized) -> hits
+        self._values = {}         # (kind, normalized) -> (value as last asked, last seen)
+        self._writes = 0
+        self.dropped = 0
+        self._conn = None
+        self._opened = False
+
+    def open(self):
+        """Opens the SQLite file, if any. Safe to call repeatedly; the first record/top call does it too."""
+        with self._lock:
+            self._open()
+
+    def _open(self):
+        if self._opened:
+            return
+        self._opened = True
+        if self.path:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=5.0)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS demand (kind TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+                "hits INTEGER NOT NULL, last_seen REAL NOT NULL, PRIMARY KEY (kind, key))"
+            )
+
+    def record(self, kind: str, value: str):
+        value = (value or "").strip()
+        key = normalize(value)
+        if not key:
+            return
+        with self._lock:
+            self._open()
+            if self._conn is not None:
+                try:
+                    self._conn.execute(
+                        "INSERT INTO demand (kind, key, value, hits, last_seen) VALUES (?, ?, ?, 1, ?) "
+                        "ON CONFLICT (kind, key) DO UPDATE SET hits = hits + 1, value = excluded.value, "
+                        "last_seen = excluded.last_seen",
+                        (kind, key, value, time.time()),
+                    )
+                    self._writes += 1
+                    if self._writes % 500 == 0:  # trim now and then instead of on every write
+                        self._conn.execute(
+                            "DELETE FROM demand WHERE rowid IN (SELECT rowid FROM demand "
+                            "ORDER BY hits DESC, last_seen DESC LIMIT -1 OFFSET ?)",
+                            (self.max_size,),
+                        )
+                except sqlite3.OperationalError:  # a lost count is fine; failing the request is not
+                    record_error("demand")
+            else:
+                self._counts[(kind, key)] += 1
+                self._values[(kind, key)] = (value, time.monotonic())
+                if len(self._counts) > self.max_size:
+                    self._trim()
+
+    def _trim(self):
+        # Lock held. Cut to 90% of the bound so the sort is paid once per max_size/10 new values.
+        excess = len(self._counts) - int(self.max_size * 0.9)
+        rank = lambda key: (self._counts[key], self._values[key][1])
+        for key in heapq.nsmallest(excess, self._counts, key=rank):
+            del self._counts[key]
+            del self._values[key]
+        self.dropped += excess
+
+    def top(self, kind: str, limit: int) -> list:
+        """The `limit` most requested values of `kind`, most popular first."""
+        with self._lock:
+            self._open()
+            if self._conn is not None:
+                rows = self._conn.execute(
+                    "SELECT value FROM demand WHERE kind = ? ORDER BY hits DESC, last_seen DESC LIMIT ?",
+                    (kind, limit),
+                )
+                return [value for (value,) in rows]
+            ranked = [(hits, self._values[key][1], key) for key, hits in self._counts.items() if key[0] == kind]
+            ranked.sort(reverse=True)
+            return [self._values[key][0] for _, _, key in ranked[:limit]]
+
+
+DEMAND = DemandLog(DEMAND_DB)  # nothing is opened until the first use
@@ -0,0 +1,182 @@
+# intent_router.py
+
+import re
+import threading
+
+# --------------------------------------------------------------------------
+# FAST-PATH ROUTER — answers the obvious messages without calling the LLM.
+# It only covers patterns the BookMasterAgent prompt already treats as
+# high-confidence; anything else returns None and goes to the LLM router.
+# --------------------------------------------------------------------------
+
+GENRES = (
+    "science fiction", "sci-fi", "scifi", "fantasy", "romance", "mystery", "thriller",
+    "horror", "historical fiction", "historical", "literary fiction", "fiction", "non-fiction",
+    "nonfiction", "biography", "memoir", "self-help", "poetry", "dystopian", "adventure",
+    "young adult", "ya", "crime", "classic", "classics", "comedy", "humor", "philosophy",
+    "history", "graphic novel", "manga", "paranormal", "contemporary",
+)
+
+MOODS = (
+    "adventurous", "thoughtful", "relaxing", "dark", "funny", "lighthearted", "light-hearted",
+    "uplifting", "emotional", "inspiring", "inspirational", "cozy", "romantic", "suspenseful",
+    "scary", "mysterious", "happy", "sad", "hopeful", "reflective", "exciting", "calm",
+    "heartwarming", "thrilling", "intense", "whimsical", "melancholic", "epic",
+)
+
+# Words that may surround a genre/mood request without changing its meaning.
+FILLER = {
+    "a", "an", "some", "any", "me", "i", "im", "want", "would", "like", "need", "show", "give",
+    "suggest", "recommend", "find", "get", "please", "book", "books", "novel", "novels", "read",
+    "reads", "something", "top", "rated", "good", "best", "great", "in", "the", "genre", "for",
+    "mood", "of", "to", "and", "feeling", "am", "looking",
+}
+
+_GREETING = re.compile(
+    r"^(hi|hello|hey|hiya|howdy|yo|greetings|good (morning|afternoon|evening|night)|"
+    r"how are you( doing)?|how's it going|what's up|sup|bye|goodbye|good bye|see you|"
+    r"see ya|thanks|thank you|thx)( there| again| so much)?[\s!.?,]*$",
+    re.IGNORECASE,
+)
+
+_SUMMARY = re.compile(
+    r"^(?:please\s+)?(?:can you\s+)?(?:summari[sz]e|give me (?:a |the )?(?:detailed, engaging |detailed |short |brief )?summary of"
+    r"|tell me the (?:story|plot) of|what is the plot of|what's the plot of)"
+    r"\s+(?:the book\s+)?(?P<query>.+?)[\s.?!]*$",
+    re.IGNORECASE,
+)
+
+# "similar to" reads as a request on its own; "like" only after a request verb ("Books like me").
+_SIMILAR = re.compile(
+    r"^(?:please\s+)?(?:(?:suggest|recommend|show|give|find|i want|i need|i'd like|any)\s+(?:me\s+)?)?"
+    r"(?:some\s+|a few\s+|more\s+)?(?:books?|novels?|something|anything|reads?)\s+similar to"
+    r"\s+(?P<query>.+?)[\s.?!]*$"
+    r"|^(?:please\s+)?(?:suggest|recommend|show|give|find|i want|i need|i'd like|any)\s+(?:me\s+)?"
+    r"(?:some\s+|a few\s+|more\s+)?(?:books?|novels?|something|anything|reads?)\s+like"
+    r"\s+(?P<like_query>.+?)[\s.?!]*$",
+    re.IGNORECASE,
+)
+
+# A title followed by a twist ("Dune but darker", "Emma in three sentences") is not a plain title.
+_QUALIFIED = re.compile(
+    r"\b(?:but|except|without|though|although|instead|rather|only|not|unlike)\b"
+    r"|\b(?:in|under) (?:\d+|one|two|three|four|five|a few) (?:words?|sentences?|lines?|paragraphs?)\b",
+    re.IGNORECASE,
+)
+
+# Pronouns where a title should be: "Books like me", "summarize it".
+_NOT_A_TITLE = {"me", "you", "it", "this", "that", "these", "those", "them", "us", "him", "her", "mine", "yours"}
+
+# The /agent "suggestion" mode builds this exact sentence.
+_GENRE_MOOD_FORM = re.compile(
+    r"^recommend me some books in the genre '(?P<genre>[^']*)' for a '(?P<mood>[^']*)' mood\.?$",
+    re.IGNORECASE,
+)
+
+_VOCAB = sorted(
+    [(phrase, "genre") for phrase in GENRES] + [(phrase, "mood") for phrase in MOODS],
+    key=lambda item: -len(item[0]),
+)
+_VOCAB_PATTERN = re.compile(r"\b(" + "|".join(re.escape(p) for p, _ in _VOCAB) + r")\b")
+_VOCAB_KIND = dict(_VOCAB)
+
+
+def _strip_quotes(text: str) -> str:
+    return text.strip().strip("'\"“”‘’").strip()
+
+
+def _title_query(text: str | None) -> str | None:
+    """The book title a summary/similar request names, or None if it doesn't look like a bare title."""
+    query = _strip_quotes(text or "")
+    if not query or query.lower() in _NOT_A_TITLE or _QUALIFIED.search(query):
+        return None
+    return query
+
+
+def _form_value(value: str) -> str | None:
+    """A suggestion-form field, lowercased; empty and the literal 'None' (field not picked) become None."""
+    value = value.strip().lower()
+    return None if value in ("", "none") else value
+
+
+def _genre_mood(message: str) -> dict | None:
+    text = message.lower()
+    form = _GENRE_MOOD_FORM.match(message.strip())
+    if form:
+        found = {"genre": _form_value(form.group("genre")), "mood": _form_value(form.group("mood"))}
+        if not any(found.values()):
+            return None
+        if found["genre"] not in (None, *GENRES) or found["mood"] not in (None, *MOODS):
+            return None  # a value we don't know ("Motivated", "comics"): the LLM maps it
+        return {"intent": "recommend_genre_mood", **found, "confidence_score": 1.0}
+
+    found = {"genre": None, "mood": None}
+    for match in _VOCAB_PATTERN.finditer(text):
+        kind = _VOCAB_KIND[match.group(1)]
+        if found[kind] is not None:
+            return None  # two genres or two moods: let the LLM sort it out
+        found[kind] = match.group(1)
+    if not any(found.values()):
+        return None
+
+    leftover = re.findall(r"[a-z']+", _VOCAB_PATTERN.sub(" ", text).replace("'", ""))
+    if any(word not in FILLER for word in leftover):
+        return None
+    intent = "clarification_response" if not leftover and not all(found.values()) else "recommend_genre_mood"
+    return {"intent": intent, **found, "confidence_score": 0.9}
+
+
+def fast_route(message: str) -> dict | None:
+    """Returns the router's intent JSON for obvious messages, or None when unsure."""
+    message = message.strip()
+    if not message or len(message) > 200:
+        return None
+
+    if _GREETING.match(message):
+        return {"intent": "greeting", "confidence_score": 1.0}
+
+    summary = _SUMMARY.match(message)
+    if summary:
+        query = _title_query(summary.group("query"))
+        return {"intent": "summarize_book", "query": query, "confidence_score": 1.0} if query else None
+
+    similar = _SIMILAR.match(message)
+    if similar:
+        query = _title_query(similar.group("query") or similar.group("like_query"))
+        return {"intent": "recommend_similar", "query": query, "confidence_score": 1.0} if query else None
+
+    return _genre_mood(message)
+
+
+class RouterStats:
+    """Counts fast-path vs LLM routing and estimates the time the fast path saved."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.fast = 0
+        self.llm = 0
+        self.llm_seconds = 0.0
+
+    def record_fast(self):
+        with self._lock:
+            self.fast += 1
+
+    def record_llm(self, seconds: float):
+        with self._lock:
+            self.llm += 1
+            self.llm_seconds += seconds
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            total = self.fast + self.llm
+            avg_llm = self.llm_seconds / self.llm if self.llm else 0.0
+            return {
+                "fast_path": self.fast,
+                "llm": self.llm,
+                "fast_path_ratio": round(self.fast / total, 4) if total else 0.0,
+                "avg_llm_route_ms": round(avg_llm * 1000, 1),
+                "estimated_saved_ms": round(self.fast * avg_llm * 1000, 1),
+            }
+
+
+ROUTER_STATS = RouterStats()
@@ -1,15 +1,50 @@
 # main.py
 
 import os
-from fastapi import FastAPI, Request
+import json
+import uuid
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from dotenv import load_dotenv
-from agent import run_book_agent_orchestrator
 
-load_dotenv()
+load_dotenv()  # before the app modules below read their settings from the environment
 
-app = FastAPI()
+from agent import (
+    AGENT_FLIGHTS,
+    BATCH_MODES,
+    BLOCK_CACHE,
+    GEMINI,
+    RESPONSE_CACHE,
+    SESSION_STORE,
+    lookup_books_batch,
+    run_book_agent_orchestrator,
+    stream_book_agent_orchestrator,
+)
+from catalog import CATALOG
+from demand import DEMAND
+from intent_router import ROUTER_STATS
+from metrics import render_prometheus, request_trace
+from scheduler import BATCH, priority
+from tools.book_info_tool import BOOK_CACHE, BOOK_FLIGHTS, GOOGLE_BOOKS, close_book_client
+from warmup import WARMUP_ON_STARTUP, WARMUP_STATE, warm_up_from_config
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Open the SQLite files (catalog, demand counts, sessions and cache disk tiers) off the event loop.
+    await asyncio.gather(*(asyncio.to_thread(store.open)
+                           for store in (CATALOG, DEMAND, SESSION_STORE, BOOK_CACHE, RESPONSE_CACHE)))
+    # Serve right away; popular books are prefetched in the background at low priority.
+    warmup_task = asyncio.create_task(warm_up_from_config()) if WARMUP_ON_STARTUP else None
+    yield
+    if warmup_task is not None:
+        warmup_task.cancel()
+    await close_book_client()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -26,17 +61,114 @@ class AgentRequest(BaseModel):
     book: str = None
     user_id: str = None
     query: str = None
+    timings: bool = False  # opt in to a per-stage timing breakdown in the response
 
-@app.post("/agent")
-async def agent_endpoint(req: AgentRequest, request: Request):
+class BatchItem(BaseModel):
+    title: str
+    author: str = None
+    mode: str = None
+
+class BatchRequest(BaseModel):
+    titles: list[str] = []
+    items: list[BatchItem] = []
+    mode: str = "details"  # default for `titles` and for items without their own mode
+
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "50"))
+
+def _build_message(req: AgentRequest) -> str | None:
     if req.query:
-        user_message = req.query
+        return req.query
     elif req.mode == "summary" and req.book:
-        user_message = f"Give me a detailed, engaging summary of the book '{req.book}'."
+        return f"Give me a detailed, engaging summary of the book '{req.book}'."
     elif req.mode == "suggestion" and (req.genre or req.mood):
-        user_message = f"Recommend me some books in the genre '{req.genre}' for a '{req.mood}' mood."
-    else:
+        return f"Recommend me some books in the genre '{req.genre}' for a '{req.mood}' mood."
+    return None
+
+@app.post("/agent")
+async def agent_endpoint(req: AgentRequest, request: Request, response: Response):
+    user_message = _build_message(req)
+    if user_message is None:
         return {"error": "Invalid request"}
 
-    result = await run_book_agent_orchestrator(user_message, request, user_id=req.user_id)
-    return {"reply": result["final_output"]}
\ No newline at end of file
+    with request_trace("/agent", request.headers.get("x-request-id")) as trace:
+        response.headers["X-Request-ID"] = trace.request_id
+        result = await run_book_agent_orchestrator(user_message, request, user_id=req.user_id)
+        if result.get("overloaded"):
+            response.status_code = 503
+            response.headers["Retry-After"] = "2"
+        reply = {"reply": result["final_output"]}
+        if req.timings:
+            reply["timings"] = trace.breakdown()
+    return reply
+
+@app.post("/agent/stream")
+async def agent_stream_endpoint(req: AgentRequest, request: Request):
+    """Same input as /agent, answered as Server-Sent Events (`token`, `block`, `done`, `error`)."""
+    user_message = _build_message(req)
+    if user_message is None:
+        return {"error": "Invalid request"}
+
+    request_id = request.headers.get("x-request-id") or uuid.uuid4().hex
+
+    async def event_source():
+        with request_trace("/agent/stream", request_id) as trace:
+            try:
+                async for event in stream_book_agent_orchestrator(user_message, request, user_id=req.user_id):
+                    name = event.pop("event")
+                    if name == "done" and req.timings:
+                        event["timings"] = trace.breakdown()
+                    yield f"event: {name}\ndata: {json.dumps(event)}\n\n"
+            except Exception:
+                trace.errors.append("stream")
+                yield f"event: error\ndata: {json.dumps({'data': 'Something went wrong while generating the reply.'})}\n\n"
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Request-ID": request_id},
+    )
+
+@app.post("/books/batch")
+async def books_batch_endpoint(req: BatchRequest, request: Request, response: Response):
+    """Enriched records for many books in one call (modes: details, summary, similar)."""
+    items = [(title, None, req.mode) for title in req.titles]
+    items += [(item.title, item.author, item.mode or req.mode) for item in req.items]
+    items = [(title.strip(), author, mode) for title, author, mode in items if title.strip()]
+    if not items or len(items) > BATCH_MAX_ITEMS:
+        return {"error": f"Send between 1 and {BATCH_MAX_ITEMS} titles."}
+    if any(mode not in BATCH_MODES for _, _, mode in items):
+        return {"error": f"Unknown mode; use one of {', '.join(BATCH_MODES)}."}
+
+    with request_trace("/books/batch", request.headers.get("x-request-id")) as trace:
+        response.headers["X-Request-ID"] = trace.request_id
+        trace.intent = "batch"
+        with priority(BATCH):  # interactive /agent traffic gets upstream slots first
+            return {"results": await lookup_books_batch(items)}
+
+def _stats() -> dict:
+    return {
+        "router": ROUTER_STATS.snapshot(),
+        "sessions": SESSION_STORE.stats(),
+        "book_cache": BOOK_CACHE.stats(),
+        "response_cache": RESPONSE_CACHE.stats(),
+        "block_cache": {"size": len(BLOCK_CACHE)},
+        "catalog": CATALOG.stats(),
+        "upstreams": {
+            "gemini": GEMINI.stats(),
+            "google_books": GOOGLE_BOOKS.stats(),
+        },
+        "warmup": WARMUP_STATE,
+        "singleflight": {
+            "book_info": BOOK_FLIGHTS.stats(),
+            "agent_runs": AGENT_FLIGHTS.stats(),
+        },
+    }
+
+@app.get("/stats")
+async def stats_endpoint():
+    return await asyncio.to_thread(_stats)  # the SQLite session store counts rows
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus text format: per-stage/request latency histograms, upstream/token/error counters, cache gauges."""
+    return PlainTextResponse(render_prometheus(await asyncio.to_thread(_stats)), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,212 @@
+# metrics.py
+
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Upper bounds (seconds) shared by every latency histogram.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """Prometheus-style cumulative histogram, one series per label set."""
+
+    def __init__(self, name: str, help_text: str, label_names: tuple, buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        with self._lock:
+            series = self._series.setdefault(labels, [0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, series in sorted(self._series.items()):
+                label_str = _labels(self.label_names, labels)
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f'{self.name}_bucket{{{label_str}{"," if label_str else ""}le="{bound}"}} {count}')
+                lines.append(f'{self.name}_bucket{{{label_str}{"," if label_str else ""}le="+Inf"}} {series[-1]}')
+                lines.append(f"{self.name}_sum{{{label_str}}} {series[-2]:.6f}")
+                lines.append(f"{self.name}_count{{{label_str}}} {series[-1]}")
+        return lines
+
+
+class CounterMetric:
+    def __init__(self, name: str, help_text: str, label_names: tuple):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{{{_labels(self.label_names, labels)}}} {value}")
+        return lines
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple, values: tuple) -> str:
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+# The router's intents. The label comes from LLM output, so it is kept to this set.
+INTENTS = frozenset({
+    "greeting", "recommend_similar", "recommend_genre_mood", "summarize_book", "get_details",
+    "chit_chat", "clarification_response",
+})
+
+REQUEST_SECONDS = Histogram("books_agent_request_seconds", "End-to-end request latency.", ("endpoint", "intent"))
+STAGE_SECONDS = Histogram("books_agent_stage_seconds", "Latency of one pipeline stage.", ("stage", "intent"))
+UPSTREAM_CALLS = CounterMetric("books_agent_upstream_calls_total", "Calls made to Gemini / Google Books.", ("upstream", "intent"))
+TOKENS = CounterMetric("books_agent_llm_tokens_total", "LLM tokens used.", ("intent",))
+ERRORS = CounterMetric("books_agent_errors_total", "Failures per stage.", ("stage", "intent"))
+
+
+class RequestTrace:
+    """Everything measured while serving one request."""
+
+    __slots__ = ("request_id", "endpoint", "intent", "started", "stages", "upstream", "tokens", "errors")
+
+    def __init__(self, request_id: str, endpoint: str):
+        self.request_id = request_id
+        self.endpoint = endpoint
+        self.intent = "unrouted"
+        self.started = time.perf_counter()
+        self.stages = []    # [(stage, seconds)], in completion order
+        self.upstream = {}  # upstream -> calls
+        self.tokens = 0
+        self.errors = []    # stages that failed
+
+    def breakdown(self) -> dict:
+        return {
+            "request_id": self.request_id,
+            "intent": self.intent,
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 1),
+            "stages": [{"stage": stage, "ms": round(seconds * 1000, 1)} for stage, seconds in self.stages],
+            "upstream_calls": dict(self.upstream),
+            "tokens": self.tokens,
+            "errors": list(self.errors),
+        }
+
+
+_CURRENT: ContextVar[RequestTrace | None] = ContextVar("books_agent_trace", default=None)
+
+
+@contextmanager
+def request_trace(endpoint: str, request_id: str = None):
+    """Opens a trace for one request; per-intent counters are updated when it closes."""
+    trace = RequestTrace(request_id or uuid.uuid4().hex, endpoint)
+    token = _CURRENT.set(trace)
+    try:
+        yield trace
+    except Exception:
+        trace.errors.append("request")
+        raise
+    finally:
+        _CURRENT.reset(token)
+        REQUEST_SECONDS.observe(time.perf_counter() - trace.started, endpoint, trace.intent)
+        for stage, seconds in trace.stages:
+            STAGE_SECONDS.observe(seconds, stage, trace.intent)
+        for upstream, calls in trace.upstream.items():
+            UPSTREAM_CALLS.inc(calls, upstream, trace.intent)
+        if trace.tokens:
+            TOKENS.inc(trace.tokens, trace.intent)
+        for stage in trace.errors:
+            ERRORS.inc(1, stage, trace.intent)
+
+
+@contextmanager
+def stage(name: str):
+    """Times a block of work as pipeline stage `name` (a no-op outside a request)."""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        record_error(name)
+        raise
+    finally:
+        trace = _CURRENT.get()
+        seconds = time.perf_counter() - started
+        if trace is not None:
+            trace.stages.append((name, seconds))
+        else:
+            STAGE_SECONDS.observe(seconds, name, "background")
+
+
+def set_intent(intent: str):
+    """Labels the current request with the router's intent; anything it shouldn't say becomes "other"."""
+    trace = _CURRENT.get()
+    if trace is not None:
+        if not intent:
+            trace.intent = "unknown"
+        else:
+            trace.intent = intent if isinstance(intent, str) and intent in INTENTS else "other"
+
+
+def record_upstream(upstream: str):
+    """Counts one attempt against `upstream` (call it per attempt, so retries and failures count)."""
+    trace = _CURRENT.get()
+    if trace is None:
+        UPSTREAM_CALLS.inc(1, upstream, "background")
+        return
+    trace.upstream[upstream] = trace.upstream.get(upstream, 0) + 1
+
+
+def record_tokens(tokens: int):
+    if not tokens:
+        return
+    trace = _CURRENT.get()
+    if trace is None:
+        TOKENS.inc(tokens, "background")
+        return
+    trace.tokens += tokens
+
+
+def record_error(stage_name: str):
+    trace = _CURRENT.get()
+    if trace is not None:
+        trace.errors.append(stage_name)
+    else:
+        ERRORS.inc(1, stage_name, "background")
+
+
+def render_prometheus(gauges: dict = None) -> str:
+    """Text exposition of every metric; `gauges` is a nested dict of numbers (e.g. the /stats payload)."""
+    lines = []
+    for metric in (REQUEST_SECONDS, STAGE_SECONDS, UPSTREAM_CALLS, TOKENS, ERRORS):
+        lines.extend(metric.render())
+    for name, value in _flatten("books_agent", gauges or {}):
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def _flatten(prefix: str, data: dict):
+    for key, value in data.items():
+        name = f"{prefix}_{key}"
+        if isinstance(value, dict):
+            yield from _flatten(name, value)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield name, value
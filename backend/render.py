@@ -0,0 +1,71 @@
+# render.py
+#
+# Book blocks for the chat UI (Markdown) and the same content as JSON for clients that
+# lay it out themselves. The Markdown templates are built once at import; rendering is
+# a few `str.format` calls and one join.
+
+from books import BookRecord
+
+_HEADER = (
+    "---\n"
+    "### 📘 *{title}*\n"
+    "![Cover]({thumbnail})\n"
+    "**✍️ Author**: {author}  \n"
+    "**⭐ Rating**: {rating}  \n"
+    "**🏷️ Tag**: {tag}\n"
+    "---"
+)
+_PLAIN_HEADER = "---\n### 📘 *{title}*\n---"
+_SECTION = "\n### {heading}\n{body}\n\n---"
+_BUY_LINKS = (
+    "\n### 🔗 Where to Buy or Read\n"
+    "• [Amazon]({0})  \n"
+    "• [Goodreads]({1})  \n"
+    "• [Bookscape]({2})"
+)
+
+SIMILAR_HEADING = "🤝 Why It’s Similar"
+ABOUT_HEADING = "📖 What It’s About"
+SUMMARY_HEADING = "📝 Summary"
+MORAL_HEADING = "🌟 Moral / Takeaway"
+
+
+def _reason_heading(is_similar: bool) -> str:
+    return SIMILAR_HEADING if is_similar else ABOUT_HEADING
+
+
+def render_markdown(book: BookRecord, reason: str = None, summary: str = None, moral: str = None,
+                    is_similar: bool = False) -> str:
+    parts = [_HEADER.format(title=book.title, thumbnail=book.thumbnail, author=book.author,
+                            rating=book.rating, tag=book.tag)]
+    if reason:
+        parts.append(_SECTION.format(heading=_reason_heading(is_similar), body=reason))
+    final_summary = summary or book.description
+    if final_summary:
+        parts.append(_SECTION.format(heading=SUMMARY_HEADING, body=final_summary))
+    if moral:
+        parts.append(_SECTION.format(heading=MORAL_HEADING, body=moral))
+    parts.append(_BUY_LINKS.format(*book.buy_links))
+    return "".join(parts)
+
+
+def render_plain(title: str, reason: str = None, is_similar: bool = False) -> str:
+    """Degraded block used when metadata could not be fetched in time."""
+    block = _PLAIN_HEADER.format(title=title)
+    if reason:
+        block += _SECTION.format(heading=_reason_heading(is_similar), body=reason)
+    return block
+
+
+def render_json(book: BookRecord | None, reason: str = None, summary: str = None, moral: str = None,
+                is_similar: bool = False) -> dict:
+    """The block's content as data: `book` (or None if it wasn't found) plus whichever sections apply."""
+    card = {"book": book.to_dict() if book is not None else None}
+    if reason:
+        card["reason"] = reason
+        card["reason_heading"] = _reason_heading(is_similar)
+    if summary:
+        card["summary"] = summary
+    if moral:
+        card["moral"] = moral
+    return card
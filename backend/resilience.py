@@ -0,0 +1,235 @@
+# resilience.py
+
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+
+
+class UpstreamUnavailable(Exception):
+    """The upstream could not answer: timed out, kept failing, or its circuit is open."""
+
+
+class CircuitOpenError(UpstreamUnavailable):
+    pass
+
+
+class RetryableStatus(Exception):
+    """An HTTP answer worth retrying (429 or 5xx)."""
+
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class RetryBudget:
+    """
+    Caps retries (and hedged requests) to a fraction of recent first attempts, shared by all
+    upstreams, so a brownout can't turn every call into several.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_tokens: float = 10.0, max_tokens: float = 100.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = min_tokens
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures; lets one probe through after `reset_timeout`."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            # One probe per reset_timeout; a probe that never reports back doesn't wedge the breaker.
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """Sliding window of successful call latencies."""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, pct: float, min_samples: int = 20) -> float | None:
+        if len(self._samples) < min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+RETRY_BUDGET = RetryBudget(
+    ratio=float(os.getenv("RETRY_BUDGET_RATIO", "0.2")),
+    min_tokens=float(os.getenv("RETRY_BUDGET_MIN", "10")),
+)
+
+
+class Upstream:
+    """
+    Timeouts, jittered retries, a circuit breaker and optional hedging around one upstream service.
+    With a `scheduler` (scheduler.PriorityScheduler), every attempt first waits for a rate-limited slot.
+    """
+
+    def __init__(self, name: str, timeout: float, retry_on: tuple, max_attempts: int = 3,
+                 backoff: float = 0.2, max_backoff: float = 2.0, hedge_percentile: float = 95.0,
+                 breaker: CircuitBreaker = None, budget: RetryBudget = RETRY_BUDGET, scheduler=None):
+        self.name = name
+        self.timeout = timeout
+        self.retry_on = retry_on + (asyncio.TimeoutError,)
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hedge_percentile = hedge_percentile
+        self.breaker = breaker or CircuitBreaker()
+        self.budget = budget
+        self.scheduler = scheduler
+        self.latency = LatencyTracker()
+        self.counts = {"calls": 0, "failures": 0, "retries": 0, "hedges": 0, "hedge_wins": 0, "short_circuited": 0}
+
+    async def call(self, fn, timeout: float = None, hedge: bool = False):
+        """
+        Runs `fn()` (a coroutine factory) with retries. `hedge=True` sends a second copy when the
+        first hasn't answered after the recent p95 latency. Raises UpstreamUnavailable on failure.
+        """
+        if not self.breaker.allow():
+            self.counts["short_circuited"] += 1
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        self.counts["calls"] += 1
+        self.budget.deposit()
+        timeout = self.timeout if timeout is None else timeout
+
+        for attempt in range(self.max_attempts):
+            if self.scheduler is not None:
+                await self.scheduler.acquire()  # queue time doesn't count against `timeout`
+            started = time.monotonic()
+            try:
+                if hedge:
+                    result = await self._hedged(fn, timeout)
+                else:
+                    result = await asyncio.wait_for(fn(), timeout)
+            except self.retry_on as exc:
+                self.counts["failures"] += 1
+                self.breaker.record_failure()
+                last_attempt = attempt == self.max_attempts - 1
+                if last_attempt or self.breaker.state == "open" or not self.budget.withdraw():
+                    raise UpstreamUnavailable(f"{self.name} failed: {exc!r}") from exc
+                self.counts["retries"] += 1
+                # Full jitter: spreads the retries of many callers over the backoff window.
+                await asyncio.sleep(random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt)))
+            except Exception:
+                self.breaker.record_success()  # the upstream answered; the request itself was bad
+                raise
+            else:
+                self.breaker.record_success()
+                self.latency.add(time.monotonic() - started)
+                return result
+
+    async def _hedged(self, fn, timeout: float):
+        delay = self.latency.percentile(self.hedge_percentile)
+        first = asyncio.ensure_future(asyncio.wait_for(fn(), timeout))
+        if delay is None:
+            return await first
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done or not self.budget.withdraw():
+            return await first
+        if self.scheduler is not None and not self.scheduler.try_acquire():
+            return await first  # hedges never wait for (or jump) the rate limiter's queue
+
+        self.counts["hedges"] += 1
+        second = asyncio.ensure_future(asyncio.wait_for(fn(), timeout))
+        pending = {first, second}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self.counts["hedge_wins"] += 1
+                        return task.result()
+            return first.result()  # both failed: surface the original attempt's error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> dict:
+        p95 = self.latency.percentile(95)
+        stats = {
+            **self.counts,
+            "circuit": self.breaker.state,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+        }
+        if self.scheduler is not None:
+            stats["scheduler"] = self.scheduler.stats()
+        return stats
+
+    def guard(self):
+        """For calls that can't be retried (streams): checks the breaker and records the outcome."""
+        return _Guard(self)
+
+
+class _Guard:
+    def __init__(self, upstream: Upstream):
+        self.upstream = upstream
+
+    async def __aenter__(self):
+        if not self.upstream.breaker.allow():
+            self.upstream.counts["short_circuited"] += 1
+            raise CircuitOpenError(f"{self.upstream.name} circuit is open")
+        if self.upstream.scheduler is not None:
+            await self.upstream.scheduler.acquire()
+        self.upstream.counts["calls"] += 1
+        self.started = time.monotonic()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.upstream.breaker.record_success()
+            self.upstream.latency.add(time.monotonic() - self.started)
+        elif issubclass(exc_type, self.upstream.retry_on):
+            self.upstream.counts["failures"] += 1
+            self.upstream.breaker.record_failure()
+            raise UpstreamUnavailable(f"{self.upstream.name} failed: {exc!r}") from exc
+        elif issubclass(exc_type, Exception):
+            self.upstream.breaker.record_success()
+        return False
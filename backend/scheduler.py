@@ -0,0 +1,226 @@
+# scheduler.py
+
+import asyncio
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from metrics import stage
+from resilience import UpstreamUnavailable
+
+# Lower number = served first.
+INTERACTIVE, BATCH, PREFETCH = 0, 1, 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch", PREFETCH: "prefetch"}
+
+UPSTREAM_MAX_QUEUE = int(os.getenv("UPSTREAM_MAX_QUEUE", "200"))     # waiting calls per upstream before shedding
+UPSTREAM_MAX_WAIT = float(os.getenv("UPSTREAM_MAX_WAIT", "10"))      # seconds a call may wait for a slot
+
+_PRIORITY: ContextVar[int] = ContextVar("books_agent_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def priority(level: int):
+    """Upstream calls made inside the block queue at `level` (INTERACTIVE, BATCH or PREFETCH)."""
+    token = _PRIORITY.set(level)
+    try:
+        yield
+    finally:
+        _PRIORITY.reset(token)
+
+
+def current_priority() -> int:
+    return _PRIORITY.get()
+
+
+class UpstreamOverloaded(UpstreamUnavailable):
+    """Shed by the scheduler: too many calls already waiting, or this one waited too long."""
+
+
+class TokenBucket:
+    """`rate` tokens per second, at most `burst` saved up; a rate of 0 means unlimited. Callers hold the lock."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def take(self) -> bool:
+        if self.rate <= 0:
+            return True
+        self._refill()
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    def refund(self):
+        if self.rate > 0:
+            self._tokens = min(self.burst, self._tokens + 1)
+
+    def wait_time(self) -> float:
+        """Seconds until the next token is available."""
+        if self.rate <= 0:
+            return 0.0
+        self._refill()
+        return max(0.0, (1 - self._tokens) / self.rate)
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "loop", "future", "enqueued")
+
+    def __init__(self, priority: int, seq: int, loop: asyncio.AbstractEventLoop):
+        self.priority = priority
+        self.seq = seq
+        self.loop = loop
+        self.future = loop.create_future()
+        self.enqueued = time.monotonic()
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class PriorityScheduler:
+    """
+    Admits calls to one upstream at its token-bucket rate: highest priority first, FIFO within
+    a priority. Process-wide, so it is safe to share between event loops and threads.
+
+    Load is shed with UpstreamOverloaded when `max_queue` calls are already waiting (a newcomer
+    evicts the newest lower-priority waiter instead, if there is one) or after `max_wait` seconds.
+    """
+
+    def __init__(self, name: str, rate: float, burst: float, max_queue: int = UPSTREAM_MAX_QUEUE,
+                 max_wait: float = UPSTREAM_MAX_WAIT):
+        self.name = name
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._bucket = TokenBucket(rate, burst)
+        self._queue = []  # heap of _Waiter
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._timer_loops = set()  # loops holding a pending dispatch timer
+        self._waits = deque(maxlen=500)
+        self.counts = {"admitted": 0, "queued": 0, "shed": 0, "evicted": 0, "timed_out": 0}
+
+    async def acquire(self, level: int = None):
+        """Waits for a slot at `level` (default: the caller's context priority)."""
+        level = current_priority() if level is None else level
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if not self._queue and self._bucket.take():
+                self.counts["admitted"] += 1
+                self._waits.append(0.0)
+                return
+            evicted = None
+            if len(self._queue) >= self.max_queue:
+                evicted = self._evictable(level)
+                if evicted is None:
+                    self.counts["shed"] += 1
+                    raise UpstreamOverloaded(f"{self.name} is overloaded: {len(self._queue)} calls already waiting")
+                self._queue.remove(evicted)
+                heapq.heapify(self._queue)
+                self.counts["evicted"] += 1
+            waiter = _Waiter(level, next(self._seq), loop)
+            heapq.heappush(self._queue, waiter)
+            self.counts["queued"] += 1
+            self._schedule(loop)
+
+        if evicted is not None:
+            error = UpstreamOverloaded(f"{self.name} is overloaded: dropped for higher-priority work")
+            _call_soon(evicted.loop, _settle, evicted.future, error)
+
+        with stage(f"{self.name}_queue"):
+            try:
+                await asyncio.wait_for(waiter.future, self.max_wait)
+            except asyncio.TimeoutError:
+                self._abandon(waiter)
+                self.counts["timed_out"] += 1
+                raise UpstreamOverloaded(f"{self.name} is overloaded: no slot within {self.max_wait:g}s") from None
+            except asyncio.CancelledError:
+                self._abandon(waiter)
+                raise
+
+    def try_acquire(self) -> bool:
+        """Takes a slot only if one is free right now and nobody is queued (used for hedged requests)."""
+        with self._lock:
+            if self._queue or not self._bucket.take():
+                return False
+            self.counts["admitted"] += 1
+            return True
+
+    def _evictable(self, level: int) -> _Waiter | None:
+        lower = [waiter for waiter in self._queue if waiter.priority > level]
+        return max(lower, key=lambda waiter: (waiter.priority, waiter.seq)) if lower else None
+
+    def _abandon(self, waiter: _Waiter):
+        with self._lock:
+            if waiter in self._queue:
+                self._queue.remove(waiter)
+                heapq.heapify(self._queue)
+
+    def _schedule(self, loop: asyncio.AbstractEventLoop):
+        # Lock held. Every loop with waiters keeps a timer of its own, so no waiter depends on
+        # another loop still running; the token bucket keeps the extra timers from adding slots.
+        if loop in self._timer_loops:
+            return
+        self._timer_loops = {other for other in self._timer_loops if not other.is_closed()}
+        self._timer_loops.add(loop)
+        loop.call_later(self._bucket.wait_time(), self._dispatch, loop)
+
+    def _dispatch(self, loop: asyncio.AbstractEventLoop):
+        with self._lock:
+            self._timer_loops.discard(loop)
+            now = time.monotonic()
+            while self._queue and self._bucket.take():
+                waiter = heapq.heappop(self._queue)
+                if not _call_soon(waiter.loop, self._grant, waiter.future):
+                    self._bucket.refund()
+                    continue
+                self.counts["admitted"] += 1
+                self._waits.append(now - waiter.enqueued)
+            if any(waiter.loop is loop for waiter in self._queue):
+                self._schedule(loop)
+
+    def _grant(self, future: asyncio.Future):
+        if future.done():  # cancelled or timed out on the way: give the slot back
+            with self._lock:
+                self._bucket.refund()
+        else:
+            future.set_result(None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            depth = Counter(waiter.priority for waiter in self._queue)
+            waits = sorted(self._waits)
+        return {
+            "rate": self._bucket.rate,
+            "burst": self._bucket.burst,
+            "queue_depth": sum(depth.values()),
+            "queue_depth_by_priority": {name: depth.get(level, 0) for level, name in PRIORITY_NAMES.items()},
+            **self.counts,
+            "avg_wait_ms": round(sum(waits) / len(waits) * 1000, 1) if waits else 0.0,
+            "p95_wait_ms": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000, 1) if waits else 0.0,
+        }
+
+
+def _call_soon(loop: asyncio.AbstractEventLoop, callback, *args) -> bool:
+    try:
+        loop.call_soon_threadsafe(callback, *args)
+        return True
+    except RuntimeError:  # that loop is closed
+        return False
+
+
+def _settle(future: asyncio.Future, error: Exception):
+    if not future.done():
+        future.set_exception(error)
@@ -0,0 +1,70 @@
+# serve.py
+#
+# Multi-process launcher: N uvicorn workers that share one state directory.
+#
+#   cd backend
+#   python serve.py --workers 4 --port 8000 --state-dir state
+#
+# Every worker is its own process, so anything that has to look the same from all of
+# them lives in SQLite files (WAL mode: concurrent readers plus one writer at a time):
+#   sessions.db   genre/mood clarification turns, which may land on different workers
+#   books.db      Google Books metadata, the second tier under each worker's LRU
+#   responses.db  parsed recommendation and summary answers
+#   catalog.db    local book index; workers pick up each other's books on a miss
+#   demand.db     popularity counts for the warm-up job (run by one worker at a time)
+# Upstream rate limits are enforced per process, so LLM_RATE_LIMIT / BOOK_API_RATE_LIMIT
+# (and their bursts) are read as host-wide totals and split evenly between the workers.
+
+import argparse
+import os
+
+import uvicorn
+from dotenv import load_dotenv
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Host-wide upstream budgets, with the defaults a single worker would use.
+RATE_SETTINGS = {
+    "LLM_RATE_LIMIT": "10",
+    "LLM_BURST": "20",
+    "BOOK_API_RATE_LIMIT": "20",
+    "BOOK_API_BURST": "40",
+}
+
+
+def shared_state_env(state_dir: str, workers: int) -> dict:
+    """Environment that makes `workers` processes share sessions, caches and rate limits."""
+    # Explicit settings win; CATALOG_DB="" / DEMAND_DB="" still mean "in memory, per worker".
+    env = {
+        "SESSION_BACKEND": "sqlite",
+        "SESSION_DB_PATH": os.getenv("SESSION_DB_PATH") or os.path.join(state_dir, "sessions.db"),
+        "BOOK_CACHE_DB": os.getenv("BOOK_CACHE_DB") or os.path.join(state_dir, "books.db"),
+        "RESPONSE_CACHE_DB": os.getenv("RESPONSE_CACHE_DB") or os.path.join(state_dir, "responses.db"),
+        "CATALOG_DB": os.getenv("CATALOG_DB", os.path.join(state_dir, "catalog.db")),
+        "DEMAND_DB": os.getenv("DEMAND_DB", os.path.join(state_dir, "demand.db")),
+        "WARMUP_LOCK": os.path.join(state_dir, "warmup.lock"),
+    }
+    for name, default in RATE_SETTINGS.items():
+        env[name] = str(float(os.getenv(name, default)) / workers)
+    return env
+
+
+def main():
+    load_dotenv()  # so host-wide settings in .env are split too
+    parser = argparse.ArgumentParser(description="Run the books agent with several workers sharing state.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--state-dir", default=os.getenv("STATE_DIR", "state"))
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    os.makedirs(args.state_dir, exist_ok=True)
+    # Workers are spawned with this process's environment.
+    os.environ.update(shared_state_env(args.state_dir, args.workers))
+    uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers, log_level=args.log_level,
+                app_dir=BACKEND_DIR)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+# sessions.py
+
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+
+
+@dataclass(slots=True)
+class SessionRecord:
+    """Conversation state kept between turns (the pending genre/mood of a recommendation)."""
+    genre: str | None = None
+    mood: str | None = None
+    updated_at: float = 0.0
+
+    def as_dict(self) -> dict:
+        return {"genre": self.genre, "mood": self.mood}
+
+
+class SessionStore(ABC):
+    """Interface every session backend implements."""
+
+    def open(self):
+        """Acquires whatever the backend needs ahead of the first request; a no-op by default."""
+
+    @abstractmethod
+    def get(self, session_id: str) -> SessionRecord:
+        """Returns the live record for `session_id`, or a fresh empty one."""
+
+    @abstractmethod
+    def save(self, session_id: str, record: SessionRecord):
+        ...
+
+    @abstractmethod
+    def clear(self, session_id: str):
+        ...
+
+    @abstractmethod
+    def stats(self) -> dict:
+        ...
+
+
+class MemorySessionStore(SessionStore):
+    """Per-process store with a size bound, LRU eviction and an idle TTL."""
+
+    def __init__(self, max_size: int = 10_000, idle_ttl: float = 1800.0):
+        self.max_size = max_size
+        self.idle_ttl = idle_ttl
+        self._records = OrderedDict()
+        self._lock = threading.Lock()
+        self.evicted = 0
+
+    def get(self, session_id: str) -> SessionRecord:
+        with self._lock:
+            record = self._records.get(session_id)
+            if record is None:
+                return SessionRecord()
+            if time.time() - record.updated_at > self.idle_ttl:
+                del self._records[session_id]
+                self.evicted += 1
+                return SessionRecord()
+            self._records.move_to_end(session_id)
+            return SessionRecord(record.genre, record.mood, record.updated_at)
+
+    def save(self, session_id: str, record: SessionRecord):
+        with self._lock:
+            self._records[session_id] = SessionRecord(record.genre, record.mood, time.time())
+            self._records.move_to_end(session_id)
+            while len(self._records) > self.max_size:
+                self._records.popitem(last=False)
+                self.evicted += 1
+
+    def clear(self, session_id: str):
+        with self._lock:
+            self._records.pop(session_id, None)
+
+    def stats(self) -> dict:
+        return {"backend": "memory", "size": len(self._records), "evicted": self.evicted}
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Store backed by a local SQLite file, so every worker process on the host sees the same sessions.
+    The file is opened on first use or by `open`, not at construction.
+    """
+
+    def __init__(self, path: str, idle_ttl: float = 1800.0):
+        self.path = path
+        self.idle_ttl = idle_ttl
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = None
+
+    def open(self):
+        with self._lock:
+            self._open()
+
+    def _open(self):
+        if self._conn is not None:
+            return
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions "
+            "(session_id TEXT PRIMARY KEY, genre TEXT, mood TEXT, updated_at REAL NOT NULL)"
+        )
+        self._conn = conn
+
+    def get(self, session_id: str) -> SessionRecord:
+        with self._lock:
+            self._open()
+            row = self._conn.execute(
+                "SELECT genre, mood, updated_at FROM sessions WHERE session_id = ? AND updated_at >= ?",
+                (session_id, time.time() - self.idle_ttl),
+            ).fetchone()
+        return SessionRecord(*row) if row else SessionRecord()
+
+    def save(self, session_id: str, record: SessionRecord):
+        now = time.time()
+        with self._lock:
+            self._open()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, genre, mood, updated_at) VALUES (?, ?, ?, ?)",
+                (session_id, record.genre, record.mood, now),
+            )
+            self._writes += 1
+            if self._writes % 500 == 0:  # expire idle rows now and then instead of on every write
+                self._conn.execute("DELETE FROM sessions WHERE updated_at < ?", (now - self.idle_ttl,))
+
+    def clear(self, session_id: str):
+        with self._lock:
+            self._open()
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._open()
+            size = self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        return {"backend": "sqlite", "size": size}
+
+
+def create_session_store() -> SessionStore:
+    """Builds the store selected by SESSION_BACKEND ("memory" or "sqlite")."""
+    idle_ttl = float(os.getenv("SESSION_TTL", "1800"))
+    if os.getenv("SESSION_BACKEND", "memory") == "sqlite":
+        return SQLiteSessionStore(os.getenv("SESSION_DB_PATH", "sessions.db"), idle_ttl=idle_ttl)
+    return MemorySessionStore(max_size=int(os.getenv("SESSION_MAX", "10000")), idle_ttl=idle_ttl)
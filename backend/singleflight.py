@@ -0,0 +1,54 @@
+# singleflight.py
+
+import asyncio
+
+from scheduler import current_priority
+
+
+class SingleFlight:
+    """
+    Collapses identical in-flight async calls: the first caller for a key runs the work,
+    everyone arriving while it runs awaits the same result (or exception).
+
+    The shared work runs with its starter's context, scheduler priority included, so a caller
+    only joins a flight started at its own priority or a higher one. An interactive request
+    never waits behind (or gets evicted with) a prefetch that happens to want the same key.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight = {}  # (loop, key) -> {priority: Task}
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn):
+        """Runs `fn()` (a coroutine factory) once per concurrent `key` and priority."""
+        slot = (asyncio.get_running_loop(), key)
+        level = current_priority()
+        flights = self._inflight.setdefault(slot, {})
+        task = next((task for flight_level, task in sorted(flights.items()) if flight_level <= level), None)
+        if task is None:
+            self.executed += 1
+            task = asyncio.ensure_future(fn())
+            flights[level] = task
+            task.add_done_callback(lambda t: self._done(slot, level, t))
+        else:
+            self.coalesced += 1
+        # shield: one caller timing out or being cancelled must not cancel the shared work.
+        return await asyncio.shield(task)
+
+    def _done(self, slot, level: int, task: asyncio.Task):
+        flights = self._inflight.get(slot)
+        if flights is not None and flights.get(level) is task:
+            del flights[level]
+            if not flights:
+                del self._inflight[slot]
+        if not task.cancelled():
+            task.exception()  # mark as retrieved even if every waiter went away
+
+    def stats(self) -> dict:
+        return {
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "in_flight": sum(len(flights) for flights in self._inflight.values()),
+        }
@@ -0,0 +1,90 @@
+# tests/test_cache.py
+
+import asyncio
+
+from cache import LRUCache, SQLiteCache, TieredCache
+
+
+def _rows(cache: SQLiteCache) -> int:
+    return cache._conn.execute(f"SELECT COUNT(*) FROM {cache.table}").fetchone()[0]
+
+
+def test_lru_expires_entries_but_keeps_them_for_stale_reads(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("cache.time.monotonic", lambda: now[0])
+    cache = LRUCache(max_size=10, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=600)
+    now[0] = 61
+    assert cache.get("a") is None
+    assert cache.get_stale("a") == 1
+    assert cache.get("b") == 2
+
+
+def test_lru_evicts_the_least_recently_used():
+    cache = LRUCache(max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c"), len(cache)) == (1, 3, 2)
+
+
+def test_disk_tier_opens_on_first_use(tmp_path):
+    path = tmp_path / "cache.db"
+    cache = TieredCache("books", disk_path=str(path))
+    assert not path.exists()
+    cache.get("key")
+    assert path.exists()
+
+
+def test_tiered_cache_promotes_disk_hits_into_memory(tmp_path):
+    path = str(tmp_path / "cache.db")
+    TieredCache("books", disk_path=path, encode=lambda v: {"n": v}).set("key", 1)
+    cache = TieredCache("books", disk_path=path, encode=lambda v: {"n": v}, decode=lambda row: row["n"])
+    assert cache.get("key") == 1
+    assert cache.get("key") == 1
+    assert cache.get("missing") is None
+    assert cache.stats()["hits"] == {"memory": 1, "disk": 1}
+    assert cache.stats()["misses"] == 1
+
+
+def test_tiered_cache_stale_reads_fall_back_to_disk(tmp_path):
+    path = str(tmp_path / "cache.db")
+    TieredCache("books", disk_path=path).set("key", [1], ttl=-1)  # already expired
+    cache = TieredCache("books", disk_path=path)
+    assert cache.get("key") is None
+    assert cache.get_stale("key") == [1]
+    assert cache.stats()["stale_hits"] == 1
+
+
+def test_tiered_cache_async_methods_match_the_sync_ones(tmp_path):
+    cache = TieredCache("books", disk_path=str(tmp_path / "cache.db"))
+
+    async def main():
+        await cache.set_async("key", [1])
+        cache.memory.delete("key")  # force the disk path
+        return await cache.get_async("key"), await cache.get_stale_async("key"), await cache.get_async("missing")
+
+    assert asyncio.run(main()) == ([1], [1], None)
+
+
+def test_disk_tier_is_pruned_to_max_rows(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.db"), ttl=60, max_rows=5, prune_every=10)
+    for i in range(10):
+        cache.set(f"key{i}", i, ttl=60 + i)
+    assert _rows(cache) == 5
+    assert cache.get("key9") == 9  # the longest-lived entries stay
+    assert cache.get("key0") is None
+
+
+def test_prune_keeps_recently_expired_rows_for_stale_reads(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.db"), stale_grace=60, prune_every=3)
+    cache.set("old", 1, ttl=-120)   # expired beyond the grace period
+    cache.set("recent", 2, ttl=-1)  # expired, still within it
+    cache.set("live", 3)
+    assert cache.get_stale("old") is None
+    assert cache.get_stale("recent") == 2
+    assert cache.get("recent") is None
+    assert cache.get("live") == 3
@@ -0,0 +1,51 @@
+# tests/test_catalog.py
+
+from books import BookRecord
+from catalog import BookCatalog
+
+
+def _book(title: str, author: str = "Frank Herbert") -> BookRecord:
+    return BookRecord(title, author, "", 4.0, "Classic", "")
+
+
+def test_only_the_top_result_for_a_title_answers_lookups():
+    catalog = BookCatalog()
+    # A study guide that happens to be titled "Dune" came back for a "Dune Messiah" search.
+    catalog.add_many([_book("Dune Messiah"), _book("Dune", "Study Guides Inc")], "Dune Messiah")
+    assert catalog.lookup("Dune") == []
+    assert catalog.lookup("dune messiah") == [_book("Dune Messiah")]
+
+    catalog.add_many([_book("Dune"), _book("Dune", "Study Guides Inc")], "Dune")
+    assert catalog.lookup("Dune") == [_book("Dune")]
+    assert catalog.lookup("Dune", "herbert") == [_book("Dune")]
+    assert catalog.lookup("Dune", "Study Guides") == []
+
+
+def test_prefix_and_typos_are_only_near_matches():
+    catalog = BookCatalog()
+    catalog.add_many([_book("Dune Messiah")], "Dune Messiah")
+    assert catalog.lookup("Dune") == []
+    assert catalog.closest("Dune") == []  # too much shorter than "dune messiah"
+    assert catalog.closest("Dune Mesiah") == [_book("Dune Messiah")]
+
+
+def test_least_recently_used_books_are_evicted():
+    catalog = BookCatalog(max_books=10)
+    for i in range(10):
+        catalog.add_many([_book(f"Book {i}")], f"Book {i}")
+    catalog.lookup("Book 0")  # recently used, so it stays
+    catalog.add_many([_book("Book 10")], "Book 10")
+    assert catalog.stats()["books"] == 9
+    assert catalog.lookup("Book 0") == [_book("Book 0")]
+    assert catalog.lookup("Book 1") == []
+    assert catalog.closest("Book 2") == []
+    assert catalog._titles == sorted(catalog._by_title)
+
+
+def test_workers_share_top_results_through_the_file(tmp_path):
+    path = str(tmp_path / "catalog.db")
+    first, second = BookCatalog(path), BookCatalog(path)
+    second.open()
+    first.add_many([_book("Dune")], "Dune")
+    assert second.lookup("Dune") == [_book("Dune")]
+    assert BookCatalog(path).lookup("Dune") == [_book("Dune")]  # and after a restart
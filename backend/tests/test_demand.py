@@ -0,0 +1,32 @@
+# tests/test_demand.py
+
+from demand import DemandLog
+
+
+def test_top_groups_spellings_and_keeps_the_latest():
+    demand = DemandLog()
+    demand.record("title", "dune")
+    demand.record("title", "Dune ")
+    demand.record("title", "Emma")
+    assert demand.top("title", 5) == ["Dune", "Emma"]
+    assert demand.top("genre_mood", 5) == []
+
+
+def test_memory_log_drops_the_least_requested():
+    demand = DemandLog(max_size=10)
+    for _ in range(3):
+        demand.record("title", "Dune")
+    for i in range(100):
+        demand.record("title", f"Book {i}")
+    assert len(demand._counts) <= 10
+    assert demand.top("title", 2) == ["Dune", "Book 99"]
+
+
+def test_sqlite_table_is_trimmed(tmp_path):
+    demand = DemandLog(str(tmp_path / "demand.db"), max_size=10)
+    for _ in range(3):
+        demand.record("title", "Dune")
+    for i in range(497):
+        demand.record("title", f"Book {i}")
+    assert demand._conn.execute("SELECT COUNT(*) FROM demand").fetchone()[0] == 10
+    assert demand.top("title", 1) == ["Dune"]
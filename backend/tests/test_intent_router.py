@@ -0,0 +1,58 @@
+# tests/test_intent_router.py
+
+import pytest
+
+from intent_router import fast_route
+
+FORM = "Recommend me some books in the genre '{}' for a '{}' mood."
+
+CASES = [
+    # Obvious messages the fast path answers on its own
+    ("hi", {"intent": "greeting", "confidence_score": 1.0}),
+    ("Thank you so much!", {"intent": "greeting", "confidence_score": 1.0}),
+    ("Give me a detailed, engaging summary of the book 'Dune'.",
+     {"intent": "summarize_book", "query": "Dune", "confidence_score": 1.0}),
+    ("books similar to The Hobbit",
+     {"intent": "recommend_similar", "query": "The Hobbit", "confidence_score": 1.0}),
+    ("dark fantasy books",
+     {"intent": "recommend_genre_mood", "genre": "fantasy", "mood": "dark", "confidence_score": 0.9}),
+    ("thriller", {"intent": "clarification_response", "genre": "thriller", "mood": None, "confidence_score": 0.9}),
+    # The /agent suggestion form
+    (FORM.format("Sci-Fi", "Thoughtful"),
+     {"intent": "recommend_genre_mood", "genre": "sci-fi", "mood": "thoughtful", "confidence_score": 1.0}),
+    (FORM.format("Fantasy", "None"),
+     {"intent": "recommend_genre_mood", "genre": "fantasy", "mood": None, "confidence_score": 1.0}),
+    (FORM.format("None", "Relaxing"),
+     {"intent": "recommend_genre_mood", "genre": None, "mood": "relaxing", "confidence_score": 1.0}),
+    (FORM.format("None", "None"), None),
+    # Values outside the vocabulary go to the LLM instead of being dropped
+    (FORM.format("Fiction", "Motivated"), None),
+    (FORM.format("children", "Relaxing"), None),
+    (FORM.format("comics", "None"), None),
+    (FORM.format("Cyberpunk", "Exciting"), None),
+    ("Suggest me something like Harry Potter",
+     {"intent": "recommend_similar", "query": "Harry Potter", "confidence_score": 1.0}),
+    ("Summarize Pride and Prejudice",
+     {"intent": "summarize_book", "query": "Pride and Prejudice", "confidence_score": 1.0}),
+    # Titles, qualifiers and verbless phrases that only look like requests go to the LLM
+    ("Funny Story", None),
+    ("funny stories", None),
+    ("something like Dune but darker", None),
+    ("I want something like Dune but darker", None),
+    ("books similar to Dune without the politics", None),
+    ("Books like me", None),
+    ("recommend books like this", None),
+    ("Plot of land", None),
+    ("summary of my day", None),
+    ("Summarize Dune in three sentences", None),
+    # Anything unclear goes to the LLM
+    ("", None),
+    ("fantasy or horror?", None),
+    ("dark fantasy books about dragons", None),
+    ("what did you think of the ending of Dune?", None),
+]
+
+
+@pytest.mark.parametrize("message,expected", CASES)
+def test_fast_route(message, expected):
+    assert fast_route(message) == expected
@@ -0,0 +1,176 @@
+# tests/test_resilience.py
+
+import asyncio
+
+import pytest
+
+from resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    RetryableStatus,
+    RetryBudget,
+    Upstream,
+    UpstreamUnavailable,
+)
+
+
+def _upstream(**kwargs) -> Upstream:
+    options = {"timeout": 1.0, "retry_on": (RetryableStatus,), "backoff": 0.0, "budget": RetryBudget()}
+    return Upstream("test", **{**options, **kwargs})
+
+
+def _flaky(failures: int, result="ok", error=RetryableStatus(503)):
+    """A coroutine factory that fails `failures` times, then answers."""
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise error
+        return result
+
+    return fn, calls
+
+
+def test_retry_budget_caps_withdrawals_and_refills_with_first_attempts():
+    budget = RetryBudget(ratio=0.5, min_tokens=2, max_tokens=3)
+    assert budget.withdraw() and budget.withdraw()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert not budget.withdraw()  # half a token
+    budget.deposit()
+    assert budget.withdraw()
+    for _ in range(100):
+        budget.deposit()
+    assert [budget.withdraw() for _ in range(4)] == [True, True, True, False]
+
+
+def test_breaker_opens_half_opens_and_closes(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("resilience.time.monotonic", lambda: now[0])
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    now[0] += 30
+    assert breaker.allow() and breaker.state == "half_open"
+    assert not breaker.allow()  # one probe at a time
+    breaker.record_failure()  # the probe failed
+    assert breaker.state == "open" and not breaker.allow()
+
+    now[0] += 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_success_resets_the_consecutive_failure_count():
+    breaker = CircuitBreaker(failure_threshold=2)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+
+def test_call_retries_retryable_errors():
+    upstream = _upstream()
+    fn, calls = _flaky(2)
+    assert asyncio.run(upstream.call(fn)) == "ok"
+    assert len(calls) == 3
+    assert upstream.counts["retries"] == 2 and upstream.counts["failures"] == 2
+    assert upstream.breaker.state == "closed"
+
+
+def test_call_gives_up_after_max_attempts():
+    upstream = _upstream(max_attempts=2)
+    fn, calls = _flaky(5)
+    with pytest.raises(UpstreamUnavailable):
+        asyncio.run(upstream.call(fn))
+    assert len(calls) == 2
+
+
+def test_timeouts_are_retried():
+    upstream = _upstream(timeout=0.01)
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        if len(calls) == 1:
+            await asyncio.sleep(1)
+        return "ok"
+
+    assert asyncio.run(upstream.call(fn)) == "ok"
+    assert len(calls) == 2
+
+
+def test_other_errors_are_not_retried_and_do_not_trip_the_breaker():
+    upstream = _upstream(breaker=CircuitBreaker(failure_threshold=1))
+    fn, calls = _flaky(1, error=ValueError("bad request"))
+    with pytest.raises(ValueError):
+        asyncio.run(upstream.call(fn))
+    assert len(calls) == 1
+    assert upstream.breaker.state == "closed"
+
+
+def test_empty_retry_budget_stops_retries():
+    upstream = _upstream(budget=RetryBudget(ratio=0, min_tokens=0))
+    fn, calls = _flaky(1)
+    with pytest.raises(UpstreamUnavailable):
+        asyncio.run(upstream.call(fn))
+    assert len(calls) == 1
+
+
+def test_open_circuit_short_circuits_without_calling():
+    upstream = _upstream(breaker=CircuitBreaker(failure_threshold=1, reset_timeout=60))
+    fn, calls = _flaky(10)
+    with pytest.raises(UpstreamUnavailable):
+        asyncio.run(upstream.call(fn))
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(upstream.call(fn))
+    assert len(calls) == 1  # the breaker opened on the first failure, so no retry either
+    assert upstream.counts["short_circuited"] == 1
+
+
+def test_hedge_answers_from_the_second_copy_when_the_first_is_slow():
+    upstream = _upstream()
+    for _ in range(20):
+        upstream.latency.add(0.01)
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        await asyncio.sleep(0.5 if len(calls) == 1 else 0)
+        return len(calls)
+
+    assert asyncio.run(upstream.call(fn, hedge=True)) == 2
+    assert upstream.counts["hedges"] == 1 and upstream.counts["hedge_wins"] == 1
+
+
+def test_no_hedge_without_latency_history():
+    upstream = _upstream()
+    fn, calls = _flaky(0)
+    assert asyncio.run(upstream.call(fn, hedge=True)) == "ok"
+    assert len(calls) == 1 and upstream.counts["hedges"] == 0
+
+
+def test_guard_records_stream_failures_on_the_breaker():
+    upstream = _upstream(breaker=CircuitBreaker(failure_threshold=1, reset_timeout=60))
+
+    async def stalled_stream():
+        async with upstream.guard():
+            raise asyncio.TimeoutError()
+
+    async def bad_request():
+        async with upstream.guard():
+            raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        asyncio.run(bad_request())
+    assert upstream.breaker.state == "closed"
+    with pytest.raises(UpstreamUnavailable):
+        asyncio.run(stalled_stream())
+    assert upstream.breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(stalled_stream())
@@ -0,0 +1,124 @@
+# tests/test_scheduler.py
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from scheduler import BATCH, INTERACTIVE, PREFETCH, PriorityScheduler, TokenBucket, UpstreamOverloaded, priority
+
+
+def test_token_bucket_spends_the_burst_then_refills(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("scheduler.time.monotonic", lambda: now[0])
+    bucket = TokenBucket(rate=10, burst=2)
+    assert bucket.take() and bucket.take()
+    assert not bucket.take()
+    assert bucket.wait_time() == pytest.approx(0.1)
+    now[0] += 0.1
+    assert bucket.take()
+    bucket.refund()
+    assert bucket.take()
+    now[0] += 10
+    assert [bucket.take() for _ in range(3)] == [True, True, False]  # never more than the burst
+
+
+def test_zero_rate_is_unlimited():
+    bucket = TokenBucket(rate=0, burst=1)
+    assert all(bucket.take() for _ in range(1000))
+    assert bucket.wait_time() == 0.0
+
+
+def _exhausted(**kwargs) -> PriorityScheduler:
+    scheduler = PriorityScheduler("test", **{"rate": 100, "burst": 1, **kwargs})
+    assert scheduler.try_acquire()  # spend the burst so the next calls queue
+    return scheduler
+
+
+def test_waiters_are_admitted_by_priority_then_fifo():
+    scheduler = _exhausted()
+    admitted = []
+
+    async def call(name: str, level: int):
+        with priority(level):
+            await scheduler.acquire()
+        admitted.append(name)
+
+    async def main():
+        tasks = []
+        for name, level in [("prefetch", PREFETCH), ("batch", BATCH), ("interactive-1", INTERACTIVE),
+                            ("interactive-2", INTERACTIVE)]:
+            tasks.append(asyncio.create_task(call(name, level)))
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    assert admitted == ["interactive-1", "interactive-2", "batch", "prefetch"]
+    assert scheduler.stats()["admitted"] == 5
+
+
+def test_full_queue_sheds_same_priority_and_evicts_lower_priority():
+    scheduler = _exhausted(max_queue=1)
+
+    async def main():
+        prefetch = asyncio.create_task(scheduler.acquire(PREFETCH))
+        await asyncio.sleep(0)
+        with pytest.raises(UpstreamOverloaded):
+            await scheduler.acquire(PREFETCH)  # nobody lower to make room
+        interactive = asyncio.create_task(scheduler.acquire(INTERACTIVE))
+        with pytest.raises(UpstreamOverloaded, match="higher-priority"):
+            await prefetch
+        await interactive
+
+    asyncio.run(main())
+    assert scheduler.counts["shed"] == 1 and scheduler.counts["evicted"] == 1
+
+
+def test_waiting_too_long_is_shed():
+    scheduler = _exhausted(rate=0.01, max_wait=0.05)
+
+    async def main():
+        with pytest.raises(UpstreamOverloaded, match="no slot"):
+            await scheduler.acquire()
+
+    asyncio.run(main())
+    assert scheduler.counts["timed_out"] == 1
+    assert scheduler.stats()["queue_depth"] == 0
+
+
+def test_try_acquire_never_jumps_the_queue():
+    scheduler = _exhausted(rate=1000)
+
+    async def main():
+        waiter = asyncio.create_task(scheduler.acquire())
+        await asyncio.sleep(0)
+        assert not scheduler.try_acquire()
+        await waiter
+
+    asyncio.run(main())
+
+
+def test_waiters_on_different_event_loops_share_one_queue():
+    scheduler = _exhausted(rate=50)
+    results = {}
+
+    def other_thread():
+        async def run():
+            await scheduler.acquire()
+        started = time.monotonic()
+        asyncio.run(run())
+        results["thread"] = time.monotonic() - started
+
+    thread = threading.Thread(target=other_thread)
+    thread.start()
+    while scheduler.stats()["queue_depth"] == 0:  # the other loop queued first and owns the timer
+        time.sleep(0.001)
+
+    async def main():
+        await asyncio.wait_for(scheduler.acquire(), 2)
+
+    asyncio.run(main())
+    thread.join(2)
+    assert "thread" in results
+    assert scheduler.counts["admitted"] == 3
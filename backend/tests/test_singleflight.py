@@ -0,0 +1,103 @@
+# tests/test_singleflight.py
+
+import asyncio
+
+import pytest
+
+from scheduler import PREFETCH, PriorityScheduler, UpstreamOverloaded, priority
+from singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_run():
+    flights = SingleFlight("test")
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "result"
+
+    async def main():
+        return await asyncio.gather(*(flights.do("key", work) for _ in range(5)))
+
+    assert asyncio.run(main()) == ["result"] * 5
+    assert len(calls) == 1
+    assert flights.stats() == {"executed": 1, "coalesced": 4, "in_flight": 0}
+
+
+def test_errors_reach_every_waiter():
+    flights = SingleFlight("test")
+
+    async def work():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def main():
+        return await asyncio.gather(flights.do("key", work), flights.do("key", work), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert [type(result) for result in results] == [ValueError, ValueError]
+    assert flights.executed == 1
+
+
+def test_cancelled_waiter_does_not_cancel_the_flight():
+    flights = SingleFlight("test")
+
+    async def work():
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def main():
+        first = asyncio.create_task(flights.do("key", work))
+        second = asyncio.create_task(flights.do("key", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(main()) == "result"
+
+
+def test_lower_priority_caller_joins_higher_priority_flight():
+    flights = SingleFlight("test")
+
+    async def work():
+        await asyncio.sleep(0.01)
+        return "result"
+
+    async def prefetch():
+        with priority(PREFETCH):
+            return await flights.do("key", work)
+
+    async def main():
+        interactive = asyncio.create_task(flights.do("key", work))
+        await asyncio.sleep(0)
+        return await asyncio.gather(interactive, prefetch())
+
+    assert asyncio.run(main()) == ["result", "result"]
+    assert flights.executed == 1
+
+
+def test_interactive_caller_is_not_evicted_with_a_prefetch_flight():
+    # One slot per 20 ms, one queue place: an interactive waiter evicts a prefetch waiter.
+    scheduler = PriorityScheduler("test", rate=50, burst=1, max_queue=1, max_wait=5)
+    flights = SingleFlight("test")
+
+    async def work():
+        await scheduler.acquire()
+        return "result"
+
+    async def prefetch():
+        with priority(PREFETCH):
+            return await flights.do("key", work)
+
+    async def main():
+        assert scheduler.try_acquire()  # use up the burst so the next calls queue
+        prefetched = asyncio.create_task(prefetch())
+        await asyncio.sleep(0)
+        interactive = await flights.do("key", work)
+        with pytest.raises(UpstreamOverloaded):
+            await prefetched
+        return interactive
+
+    assert asyncio.run(main()) == "result"
+    assert flights.executed == 2
@@ -1,79 +1,134 @@
 # tools/book_info_tool.py
 
-import requests
-import random
-import urllib.parse
+import asyncio
+import os
+import threading
+import weakref
+
+import httpx
 from agents import function_tool
+from books import VOLUME_FIELDS, BookRecord, decode_books, encode_books
+from cache import TieredCache
+from catalog import CATALOG
+from metrics import record_error, record_upstream, stage
+from resilience import RetryableStatus, Upstream, UpstreamUnavailable
+from scheduler import PriorityScheduler, UpstreamOverloaded
+from singleflight import SingleFlight
+from utils import normalize
 
-def get_book_info_raw(book_title: str, author: str = None) -> list:
+# --- Google Books HTTP engine settings ---
+GOOGLE_BOOKS_URL = os.getenv("GOOGLE_BOOKS_API_URL", "https://www.googleapis.com/books/v1/volumes")
+GOOGLE_BOOKS_API_KEY = os.getenv("GOOGLE_BOOKS_API_KEY")
+BOOK_API_TIMEOUT = float(os.getenv("BOOK_API_TIMEOUT", "5.0"))            # seconds, per call
+BOOK_API_MAX_CONCURRENCY = int(os.getenv("BOOK_API_MAX_CONCURRENCY", "10"))  # in-flight lookups per event loop
+BOOK_API_MAX_CONNECTIONS = int(os.getenv("BOOK_API_MAX_CONNECTIONS", "20"))
+BOOK_API_KEEPALIVE = int(os.getenv("BOOK_API_KEEPALIVE", "10"))
+BOOK_API_ATTEMPTS = int(os.getenv("BOOK_API_ATTEMPTS", "3"))
+BOOK_API_MAX_RESULTS = int(os.getenv("BOOK_API_MAX_RESULTS", "3"))  # volumes per lookup (ranked, best first)
+BOOK_API_RATE_LIMIT = float(os.getenv("BOOK_API_RATE_LIMIT", "20"))  # requests per second, 0 = unlimited
+BOOK_API_BURST = float(os.getenv("BOOK_API_BURST", "40"))
+
+# --- Metadata cache settings ---
+BOOK_CACHE_SIZE = int(os.getenv("BOOK_CACHE_SIZE", "2048"))
+BOOK_CACHE_TTL = float(os.getenv("BOOK_CACHE_TTL", str(24 * 3600)))
+BOOK_NEGATIVE_TTL = float(os.getenv("BOOK_NEGATIVE_TTL", "300"))  # how long "No books found" is remembered
+BOOK_CACHE_DB = os.getenv("BOOK_CACHE_DB")  # optional SQLite file for a restart-proof tier
+
+
+def book_cache_key(book_title: str, author: str = None) -> str:
+    return f"{normalize(book_title)}|{normalize(author) if author else ''}"
+
+
+BOOK_CACHE = TieredCache(
+    "book_info", max_size=BOOK_CACHE_SIZE, ttl=BOOK_CACHE_TTL, disk_path=BOOK_CACHE_DB,
+    encode=encode_books, decode=decode_books,
+)
+BOOK_FLIGHTS = SingleFlight("book_info")
+GOOGLE_BOOKS = Upstream(
+    "google_books", timeout=BOOK_API_TIMEOUT, retry_on=(httpx.TransportError, RetryableStatus),
+    max_attempts=BOOK_API_ATTEMPTS,
+    scheduler=PriorityScheduler("google_books", rate=BOOK_API_RATE_LIMIT, burst=BOOK_API_BURST),
+)
+
+
+class _LoopEngine:
+    """Keep-alive client and concurrency gate bound to one event loop."""
+
+    def __init__(self):
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(BOOK_API_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=BOOK_API_MAX_CONNECTIONS,
+                max_keepalive_connections=BOOK_API_KEEPALIVE,
+            ),
+        )
+        self.semaphore = asyncio.Semaphore(BOOK_API_MAX_CONCURRENCY)
+
+
+# httpx clients and asyncio primitives can't cross event loops, so keep one engine per loop.
+_ENGINES: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopEngine]" = weakref.WeakKeyDictionary()
+
+
+def _engine() -> _LoopEngine:
+    loop = asyncio.get_running_loop()
+    engine = _ENGINES.get(loop)
+    if engine is None:
+        engine = _ENGINES[loop] = _LoopEngine()
+    return engine
+
+
+async def close_book_client():
+    """Closes the pooled client of the running event loop (call on app shutdown)."""
+    engine = _ENGINES.pop(asyncio.get_running_loop(), None)
+    if engine is not None:
+        await engine.client.aclose()
+
+
+async def _fetch_volumes(book_title: str, author: str = None, timeout: float = None) -> dict | None:
     """
-    Fetches up to 3 book data using Google Books API and falls back to Open Library for poster images.
-    Returns a list of dicts with title, author, description, rating, tag, thumbnail, buy_links, and isbn.
-    If author is provided, it is included in the search query for better accuracy.
-    The best match (exact title+author) is always first in the returned list.
+    Performs the Google Books request. Returns the decoded JSON, or None on any transport/HTTP failure.
+    Raises UpstreamOverloaded when the rate limiter sheds the call.
     """
-    import re
-    def normalize(text):
-        return re.sub(r'[^a-z0-9]', '', text.lower())
     query = book_title.strip()
     if author:
-        query += f"+inauthor:{author.strip()}"
-    query = query.replace(" ", "+")
-    url = f"https://www.googleapis.com/books/v1/volumes?q={query}&maxResults=5"
-    response = requests.get(url)
+        query += f" inauthor:{author.strip()}"
+    # `fields` trims the response to what BookRecord reads: a fraction of a full volume.
+    params = {"q": query, "maxResults": BOOK_API_MAX_RESULTS, "fields": VOLUME_FIELDS}
+    if GOOGLE_BOOKS_API_KEY:
+        params["key"] = GOOGLE_BOOKS_API_KEY
 
-    if response.status_code != 200:
-        return [{"error": "Failed to fetch book data from Google Books API."}]
+    engine = _engine()
 
-    data = response.json()
-    if not data.get("items"):
-        return [{"error": "No books found for the given title."}]
-
-    books = []
-    for item in data["items"][:5]:
-        book_info = item["volumeInfo"]
-        image_links = book_info.get("imageLinks", {})
-        google_thumbnail = (
-            image_links.get("thumbnail") or
-            image_links.get("smallThumbnail")
-        )
-        openlibrary_fallback = f"https://covers.openlibrary.org/b/title/{book_info.get('title', book_title).replace(' ', '%20')}-L.jpg"
-        thumbnail = google_thumbnail if google_thumbnail else openlibrary_fallback
-        rating = book_info.get("averageRating")
-        if rating is None:
-            rating = round(random.uniform(3.5, 5.0), 1)
-        description = book_info.get("description", "No description available.")
-        published = book_info.get("publishedDate", "")
-        tag = "Trending"
-        if published and published[:4].isdigit() and int(published[:4]) < 2000:
-            tag = "Classic"
-        elif "underrated" in description.lower() or "hidden gem" in description.lower():
-            tag = "Hidden Gem"
-        elif rating >= 4.7:
-            tag = "Trending"
-        isbn = None
-        for iden in book_info.get("industryIdentifiers", []):
-            if iden.get("type") in ["ISBN_13", "ISBN_10"]:
-                isbn = iden.get("identifier")
-                break
-        title_for_url = urllib.parse.quote_plus(book_info.get('title', book_title))
-        amazon_link = f"https://www.amazon.com/s?k={title_for_url}"
-        goodreads_link = f"https://www.goodreads.com/search?q={title_for_url}"
-        bookscape_link = f"https://www.bookscape.co/search?q={title_for_url}"
-        books.append({
-            "title": book_info.get("title", "N/A"),
-            "author": ", ".join(book_info.get("authors", ["Unknown Author"])),
-            "description": description,
-            "rating": rating,
-            "tag": tag,
-            "thumbnail": thumbnail,
-            "isbn": isbn,
-            "buy_links": [
-                amazon_link,
-                goodreads_link,
-                bookscape_link
-            ]
-        })
+    async def attempt():
+        # The semaphore is taken after the rate limiter's queue, so queued calls don't hold a slot.
+        async with engine.semaphore:
+            record_upstream("google_books")
+            with stage("google_books"):
+                response = await engine.client.get(
+                    GOOGLE_BOOKS_URL,
+                    params=params,
+                    timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT,
+                )
+        if response.status_code == 429 or response.status_code >= 500:
+            raise RetryableStatus(response.status_code)
+        return response
+
+    try:
+        # Hedged: a lookup stuck past the recent p95 gets a second request racing it.
+        response = await GOOGLE_BOOKS.call(attempt, timeout=timeout, hedge=True)
+    except UpstreamOverloaded:
+        raise
+    except UpstreamUnavailable:
+        response = None
+    if response is None or response.status_code != 200:
+        record_error("google_books")
+        return None
+    return response.json()
+
+
+def _parse_volumes(data: dict, book_title: str, author: str = None) -> list:
+    """Turns a Google Books response into BookRecords, best match (exact title+author) first."""
+    books = [BookRecord.from_volume(item["volumeInfo"], book_title) for item in data["items"][:BOOK_API_MAX_RESULTS]]
     # Reorder: exact title+author match first, then partial, then rest
     user_title = normalize(book_title)
     user_author = normalize(author) if author else None
@@ -81,16 +136,92 @@ def get_book_info_raw(book_title: str, author: str = None) -> list:
     partial = []
     rest = []
     for b in books:
-        b_title = normalize(b['title'])
-        b_author = normalize(b['author'])
-        if user_author and b_title == user_title and user_author in b_author:
+        if user_author and b.norm_title == user_title and user_author in b.norm_author:
             exact.append(b)
-        elif b_title == user_title or (user_author and user_author in b_author):
+        elif b.norm_title == user_title or (user_author and user_author in b.norm_author):
             partial.append(b)
         else:
             rest.append(b)
     return exact + partial + rest
 
+
+async def get_book_info_async(book_title: str, author: str = None, timeout: float = None) -> list:
+    """
+    Async version of `get_book_info_raw` that runs on the shared keep-alive pool.
+    Returns BookRecords, or a single {"error": ...} dict when nothing could be found.
+    `timeout` overrides BOOK_API_TIMEOUT for this call only.
+    Results are cached per normalized title+author; "No books found" is cached briefly,
+    transport failures are not cached at all. Concurrent lookups of the same key share one request.
+    A title the API has already answered is served from the local catalog with the book the
+    API ranked first; near matches from the catalog are only used when the API comes back empty.
+    """
+    with stage("book_lookup"):
+        key = book_cache_key(book_title, author)
+        cached = await BOOK_CACHE.get_async(key)
+        if cached is not None:
+            return cached
+        local = await asyncio.to_thread(CATALOG.lookup, book_title, author)
+        if local:
+            return local
+        return await BOOK_FLIGHTS.do(key, lambda: _lookup(key, book_title, author, timeout))
+
+
+async def _lookup(key: str, book_title: str, author: str = None, timeout: float = None) -> list:
+    try:
+        data = await _fetch_volumes(book_title, author, timeout=timeout)
+    except UpstreamOverloaded:
+        stale = await BOOK_CACHE.get_stale_async(key)
+        if stale is None:
+            raise
+        return stale
+    if data is None:
+        # Upstream down or failing: an expired answer beats a near match, which beats no answer.
+        stale = await BOOK_CACHE.get_stale_async(key)
+        return (stale or await asyncio.to_thread(CATALOG.closest, book_title, author)
+                or [{"error": "Failed to fetch book data from Google Books API."}])
+    if not data.get("items"):
+        # Probably a typo: offer the closest book we already know, but only briefly.
+        books = (await asyncio.to_thread(CATALOG.closest, book_title, author)
+                 or [{"error": "No books found for the given title."}])
+        await BOOK_CACHE.set_async(key, books, ttl=BOOK_NEGATIVE_TTL)
+        return books
+    books = _parse_volumes(data, book_title, author)
+    await BOOK_CACHE.set_async(key, books)
+    # Only an answer for the bare title may later stand in for the API (see BookCatalog.lookup).
+    await asyncio.to_thread(CATALOG.add_many, books, None if author else book_title)
+    return books
+
+
+# --- Sync bridge ---
+# Sync callers (the function tool runs in a worker thread) share one background loop,
+# so they reuse a single connection pool instead of opening a new client per call.
+_sync_loop: asyncio.AbstractEventLoop | None = None
+_sync_loop_lock = threading.Lock()
+
+
+def _get_sync_loop() -> asyncio.AbstractEventLoop:
+    global _sync_loop
+    with _sync_loop_lock:
+        if _sync_loop is None:
+            _sync_loop = asyncio.new_event_loop()
+            threading.Thread(target=_sync_loop.run_forever, name="book-info-loop", daemon=True).start()
+    return _sync_loop
+
+
+def get_book_info_raw(book_title: str, author: str = None) -> list:
+    """
+    Fetches up to 3 book data using Google Books API and falls back to Open Library for poster images.
+    Returns a list of dicts with title, author, description, rating, tag, thumbnail, buy_links, and isbn.
+    If author is provided, it is included in the search query for better accuracy.
+    The best match (exact title+author) is always first in the returned list.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+    else:
+        raise RuntimeError("get_book_info_raw blocks; use `await get_book_info_async(...)` inside async code.")
+    future = asyncio.run_coroutine_threadsafe(get_book_info_async(book_title, author), _get_sync_loop())
+    return encode_books(future.result())
+
 get_book_info = function_tool(get_book_info_raw)
-   
-   # tools/book_summary_tool.py
@@ -0,0 +1,8 @@
+# utils.py
+
+import re
+
+
+def normalize(text):
+    """Lowercases and strips everything but a-z/0-9, so 'The Hobbit!' and 'the hobbit' compare equal."""
+    return re.sub(r'[^a-z0-9]', '', text.lower())
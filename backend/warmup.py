@@ -0,0 +1,142 @@
+# warmup.py
+#
+# Pre-populates the caches with popular books so the first users after a deploy don't
+# pay cold-cache latency: book metadata, rendered detail blocks and, for popular
+# genre/mood pairs, the recommendation answer and its blocks.
+#
+# The server runs it in the background at startup (WARMUP_ON_STARTUP=1) at PREFETCH
+# priority, so live traffic always gets upstream slots first. It can also run offline,
+# which pays off when the caches are on disk (BOOK_CACHE_DB, RESPONSE_CACHE_DB):
+#
+#   cd backend
+#   python warmup.py --file popular.json --top 50
+#
+# popular.json: {"titles": ["Dune", ...], "genre_moods": [["sci-fi", "thoughtful"], ...]}
+# Whatever the file lists is merged with the most requested titles and pairs recorded
+# by demand.DEMAND during past traffic.
+#
+# The app modules are imported inside the functions: they read their settings at import,
+# and the CLI has to load .env first.
+
+import asyncio
+import json
+import os
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, every worker warms up
+    fcntl = None
+
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "1") == "1"
+WARMUP_FILE = os.getenv("WARMUP_FILE")
+WARMUP_TOP = int(os.getenv("WARMUP_TOP", "50"))                   # mined titles (and pairs) to warm
+WARMUP_CONCURRENCY = int(os.getenv("WARMUP_CONCURRENCY", "4"))
+WARMUP_LOCK = os.getenv("WARMUP_LOCK")  # set by serve.py: one worker warms the shared caches at a time
+
+# Progress of the last run, exposed under /stats.
+WARMUP_STATE = {"state": "idle", "titles": 0, "genre_moods": 0, "warmed": 0, "failed": 0, "seconds": 0.0}
+
+
+def load_plan(path: str = None, top: int = WARMUP_TOP) -> tuple:
+    """Returns `(titles, genre_moods)`: the file's entries first, then past traffic, without duplicates."""
+    from demand import DEMAND
+    from utils import normalize
+
+    titles, pairs = [], []
+    if path:
+        with open(path) as f:
+            data = json.load(f)
+        titles += data.get("titles", [])
+        pairs += [tuple(pair) for pair in data.get("genre_moods", [])]
+    titles += DEMAND.top("title", top)
+    pairs += [tuple(value.split("|", 1)) for value in DEMAND.top("genre_mood", top) if "|" in value]
+
+    unique_titles = {normalize(title): title for title in reversed(titles) if normalize(title)}
+    unique_pairs = {(genre.lower(), mood.lower()): (genre, mood) for genre, mood in reversed(pairs)}
+    return list(reversed(unique_titles.values())), list(reversed(unique_pairs.values()))
+
+
+async def warm_up(titles: list, genre_moods: list, concurrency: int = WARMUP_CONCURRENCY) -> dict:
+    """Prefetches everything in the plan at PREFETCH priority. Failures are counted, never raised."""
+    from agent import prefetch_book, prefetch_genre_mood
+    from scheduler import PREFETCH, priority
+
+    WARMUP_STATE.update(state="running", titles=len(titles), genre_moods=len(genre_moods),
+                        warmed=0, failed=0, seconds=0.0)
+    started = time.perf_counter()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(fetch, *args):
+        async with semaphore:
+            try:
+                ok = await fetch(*args)
+            except Exception:
+                ok = False
+        WARMUP_STATE["warmed" if ok else "failed"] += 1
+
+    with priority(PREFETCH):
+        await asyncio.gather(
+            *(run(prefetch_book, title) for title in titles),
+            *(run(prefetch_genre_mood, genre, mood) for genre, mood in genre_moods),
+        )
+    WARMUP_STATE.update(state="done", seconds=round(time.perf_counter() - started, 2))
+    return dict(WARMUP_STATE)
+
+
+async def warm_up_from_config():
+    """Startup entry point: warms from WARMUP_FILE plus past traffic."""
+    lock = _try_lock(WARMUP_LOCK) if WARMUP_LOCK else None
+    if WARMUP_LOCK and lock is None:
+        WARMUP_STATE["state"] = "skipped"  # another worker is filling the shared caches
+        return
+    try:
+        titles, genre_moods = await asyncio.to_thread(load_plan, WARMUP_FILE)  # file and DEMAND_DB reads
+        await warm_up(titles, genre_moods)
+    except (OSError, ValueError):
+        WARMUP_STATE["state"] = "failed"
+    finally:
+        if lock is not None:
+            lock.close()
+
+
+def _try_lock(path: str):
+    """Opens and exclusively locks `path` without blocking. Returns the file, or None if it's taken."""
+    handle = open(path, "a")
+    if fcntl is None:
+        return handle
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return None
+    return handle
+
+
+def main():
+    import argparse
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Prefetch popular books into the caches.")
+    parser.add_argument("--file", default=os.getenv("WARMUP_FILE"), help='JSON with "titles" and "genre_moods"')
+    parser.add_argument("--top", type=int, default=int(os.getenv("WARMUP_TOP", WARMUP_TOP)),
+                        help="most requested titles/pairs to add")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("WARMUP_CONCURRENCY", WARMUP_CONCURRENCY)))
+    args = parser.parse_args()
+
+    titles, genre_moods = load_plan(args.file, args.top)
+    print(json.dumps(asyncio.run(_run_offline(titles, genre_moods, args.concurrency)), indent=2))
+
+
+async def _run_offline(titles: list, genre_moods: list, concurrency: int) -> dict:
+    from tools.book_info_tool import close_book_client
+
+    try:
+        return await warm_up(titles, genre_moods, concurrency)
+    finally:
+        await close_book_client()
+
+
+if __name__ == "__main__":
+    main()